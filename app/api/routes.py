@@ -1,8 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from time import perf_counter
+from typing import List
+
+import anyio
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi import Request
-from app.models.schemas import SearchRequest, SearchResponse, MethodResult, MatchHit
+from fastapi.responses import Response, StreamingResponse
+from app.models.schemas import (
+    SearchRequest, SearchResponse, FormatResult, MethodResult, MatchHit,
+    BatchSearchRequest, BatchSearchItem, IndexRefreshResponse, CacheStats, EvalJob,
+)
 from app.core.config import settings
+from app.services.index_store import update_index
 from app.services.matcher_service import MatcherService
+from app.services.metric_index import build_metric_indexes
+from app.services.segments import build_segment_tables
+from app.services.composite import build_record_index
+from app.services.eval_jobs import EvalJobManager, TERMINAL
+from app.services.evaluation import read_test_set, results_to_csv, results_to_json
+from app.services import metrics
 
 router = APIRouter()
 
@@ -10,25 +26,268 @@ def get_services(req: Request) -> MatcherService:
     svc: MatcherService = req.app.state.matcher_service
     return svc
 
+def get_eval_jobs(req: Request) -> EvalJobManager:
+    return req.app.state.eval_jobs
+
 @router.post("/search", response_model=SearchResponse)
 def search(payload: SearchRequest, svc: MatcherService = Depends(get_services)):
-    results = svc.run_methods(
+    t0 = perf_counter()
+    try:
+        if payload.fusion is not None:
+            return _fused_search(payload, svc, t0)
+        results = svc.run_methods(
+            query=payload.query,
+            field=payload.field,
+            methods=payload.methods,            # None or [] -> defaults to all in service
+            formats=payload.formats,            # None or [] -> settings.default_format
+            limit=payload.limit,                # clamped in service
+            score_cutoff=payload.score_cutoff,  # defaulted in service if None
+            method_params=payload.method_params,# {} defaulted in service if None
+            candidates=payload.candidates,
+            max_candidates=payload.max_candidates,
+            recall_target=payload.recall_target,
+            use_cache=payload.use_cache,
+            deadline_ms=payload.deadline_ms,
+            composite=payload.composite.model_dump(),
+        )
+    except ValueError as e:
+        # unknown method, format or malformed cascade (checked before anything runs)
+        raise HTTPException(400, str(e))
+    t_response = perf_counter()
+    response = SearchResponse(
+        query=payload.query,
+        fields=["first", "last"] if payload.field == "composite" else [payload.field],
+        results=[_format_result(f) for f in results]
+    )
+    if settings.instrumentation:
+        done = perf_counter()
+        metrics.stage_seconds.observe(done - t_response, stage="response", format="")
+        metrics.searches.inc(endpoint="search", field=payload.field)
+        metrics.search_seconds.observe(done - t0, endpoint="search", field=payload.field)
+        if payload.include_spans:
+            response.extras["spans"] = [
+                {**s, "format": f["format"]} for f in results for s in f.get("spans", [])
+            ] + [{"name": "response", "ms": (done - t_response) * 1000.0}]
+    return response
+
+
+def _fused_search(payload: SearchRequest, svc: MatcherService, t0: float) -> SearchResponse:
+    fused = svc.run_fused(
         query=payload.query,
         field=payload.field,
-        methods=payload.methods,            # None or [] -> defaults to all in service
-        limit=payload.limit,                # clamped in service
-        score_cutoff=payload.score_cutoff,  # defaulted in service if None
-        method_params=payload.method_params # {} defaulted in service if None
+        methods=payload.methods,
+        formats=payload.formats,
+        limit=payload.limit,
+        method_params=payload.method_params,
+        candidates=payload.candidates,
+        max_candidates=payload.max_candidates,
+        recall_target=payload.recall_target,
+        use_cache=payload.use_cache,
+        deadline_ms=payload.deadline_ms,
+        composite=payload.composite.model_dump(),
+        fusion=payload.fusion.model_dump(),
     )
-    return SearchResponse(
+    t_response = perf_counter()
+    response = SearchResponse(
         query=payload.query,
-        fields=[payload.field],
-        results=[
+        fields=["first", "last"] if payload.field == "composite" else [payload.field],
+        results=[FormatResult(
+            format="fused",
+            methods=[MethodResult(
+                method=fused["mode"],
+                duration_ms=fused["duration_ms"],
+                hits=[MatchHit(**h) for h in fused["hits"]],
+            )],
+        )],
+        extras={"fusion": {"components": fused["components"]}},
+    )
+    if settings.instrumentation:
+        done = perf_counter()
+        metrics.stage_seconds.observe(done - t_response, stage="response", format="")
+        metrics.searches.inc(endpoint="search", field=payload.field)
+        metrics.search_seconds.observe(done - t0, endpoint="search", field=payload.field)
+        if payload.include_spans:
+            response.extras["spans"] = fused["spans"] + [{"name": "response", "ms": (done - t_response) * 1000.0}]
+    return response
+
+
+def _format_result(f) -> FormatResult:
+    return FormatResult(
+        format=f["format"],
+        candidates=f.get("candidates"),
+        methods=[
             MethodResult(
                 method=r["method"],
                 duration_ms=r.get("duration_ms"),
+                status=r.get("status", "ok"),
+                cached=r.get("cached", False),
                 hits=[MatchHit(**h) for h in r["hits"]],
             )
-            for r in results
-        ]
+            for r in f["results"]
+        ],
     )
+
+
+@router.post("/search/batch")
+def search_batch(payload: BatchSearchRequest, svc: MatcherService = Depends(get_services)):
+    """
+    Score many queries in one request. Responds with NDJSON: one BatchSearchItem
+    per query, in input order, streamed as each chunk of queries is scored.
+    """
+    if len(payload.queries) > settings.max_batch_queries:
+        raise HTTPException(413, f"At most {settings.max_batch_queries} queries per batch")
+
+    try:
+        # validated here, before the 200 headers go out with the stream
+        items = svc.run_batch(
+            queries=payload.queries,
+            field=payload.field,
+            methods=payload.methods,
+            formats=payload.formats,
+            limit=payload.limit,
+            score_cutoff=payload.score_cutoff,
+            method_params=payload.method_params,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    def ndjson():
+        t0 = perf_counter()
+        for item in items:
+            line = BatchSearchItem(query=item["query"], results=[_format_result(f) for f in item["results"]])
+            yield line.model_dump_json() + "\n"
+        if settings.instrumentation:
+            metrics.searches.inc(len(payload.queries), endpoint="batch", field=payload.field)
+            metrics.search_seconds.observe(perf_counter() - t0, endpoint="batch", field=payload.field)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.post("/index/refresh", response_model=IndexRefreshResponse)
+def refresh_index(req: Request, svc: MatcherService = Depends(get_services)):
+    """
+    Re-read settings.data_path, transcribe only names missing from the persisted
+    index, and hot-swap the new dataset into the running service.
+    """
+    t0 = perf_counter()
+    container, stats = update_index(path=settings.data_path, limit=settings.preload_limit)
+    if settings.metric_index:
+        build_metric_indexes(container)
+    build_segment_tables(container)
+    build_record_index(container)
+    req.app.state.data = container
+    svc.swap_data(container)
+    return IndexRefreshResponse(
+        mode=stats["mode"],
+        added=stats["added"],
+        transcribed=stats["transcribed"],
+        sizes={
+            "first": len(container.df_first),
+            "last": len(container.df_last),
+            "full": len(container.df_full),
+        },
+        duration_ms=(perf_counter() - t0) * 1000.0,
+    )
+
+
+@router.get("/cache", response_model=CacheStats)
+def cache_stats(svc: MatcherService = Depends(get_services)):
+    """Hit/miss counters of the search result cache."""
+    return CacheStats(**svc.cache.stats())
+
+
+# ---------- evaluation jobs ----------
+
+@router.post("/eval/jobs", response_model=EvalJob, status_code=202)
+def create_eval_job(
+    req: Request,
+    field: str = Form("full"),
+    dataset_name: str = Form(""),
+    upload: UploadFile | None = File(None),
+    jobs: EvalJobManager = Depends(get_eval_jobs),
+):
+    """Start an evaluation in the background; poll GET /eval/jobs/{id} or stream /events."""
+    has_upload = bool(upload and upload.filename)
+    try:
+        pairs_df, source = read_test_set(
+            dataset_name, upload.file if has_upload else None, upload.filename if has_upload else ""
+        )
+    except Exception as e:
+        raise HTTPException(400, f"Failed to read dataset: {e}")
+    if pairs_df is None or pairs_df.empty:
+        raise HTTPException(400, "Please choose a dataset or upload a CSV.")
+    try:
+        job_id = jobs.submit(req.app.state.data, field, pairs_df, dataset=source)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return jobs.get(job_id)
+
+
+@router.get("/eval/jobs", response_model=List[EvalJob])
+def list_eval_jobs(jobs: EvalJobManager = Depends(get_eval_jobs)):
+    """All known jobs, newest first, without their results."""
+    return jobs.list()
+
+
+def _job_or_404(jobs: EvalJobManager, job_id: str) -> dict:
+    state = jobs.get(job_id)
+    if state is None:
+        raise HTTPException(404, f"Unknown evaluation job: {job_id}")
+    return state
+
+
+@router.get("/eval/jobs/{job_id}", response_model=EvalJob)
+def get_eval_job(job_id: str, jobs: EvalJobManager = Depends(get_eval_jobs)):
+    """Status, progress and the results finished so far."""
+    return _job_or_404(jobs, job_id)
+
+
+@router.post("/eval/jobs/{job_id}/cancel", response_model=EvalJob)
+def cancel_eval_job(job_id: str, jobs: EvalJobManager = Depends(get_eval_jobs)):
+    """Stop a job after the (format, method) it is running; finished results are kept."""
+    _job_or_404(jobs, job_id)
+    jobs.cancel(job_id)
+    return jobs.get(job_id)
+
+
+@router.get("/eval/jobs/{job_id}/events")
+async def eval_job_events(job_id: str, jobs: EvalJobManager = Depends(get_eval_jobs)):
+    """
+    Server-sent events: a "progress" event whenever the job changes, carrying
+    its status, progress and the (format, method) results finished since the
+    previous event, then a final "end" event.
+    """
+    _job_or_404(jobs, job_id)
+
+    async def events():
+        version, sent = -1, 0
+        while True:
+            state = jobs.get(job_id)
+            if state["version"] != version:
+                version = state["version"]
+                units = [{"format": f["format"], **r} for f in state["results"] for r in f["results"]]
+                data = {k: state[k] for k in ("status", "progress", "error", "version")}
+                yield f"event: progress\ndata: {json.dumps({**data, 'units': units[sent:]})}\n\n"
+                sent = len(units)
+            if state["status"] in TERMINAL:
+                yield f"event: end\ndata: {json.dumps({'status': state['status']})}\n\n"
+                return
+            await anyio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/eval/jobs/{job_id}/export")
+def export_eval_job(job_id: str, format: str = "json", jobs: EvalJobManager = Depends(get_eval_jobs)):
+    """The job's results as a JSON (everything) or CSV (summary rows) download."""
+    state = _job_or_404(jobs, job_id)
+    name = f"eval-{state['field']}-{job_id}"
+    if format == "csv":
+        body, media_type = results_to_csv(state["results"]), "text/csv"
+    elif format == "json":
+        meta = {k: state[k] for k in ("id", "status", "field", "dataset", "created_at", "finished_at")}
+        body, media_type = results_to_json(state["results"], **meta), "application/json"
+    else:
+        raise HTTPException(400, "format must be 'json' or 'csv'")
+    return Response(body, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'})
@@ -0,0 +1,313 @@
+"""
+Benchmark the matchers on generated (or sampled) name sets of several sizes.
+
+For each size the benchmark runs in a fresh child process and reports
+  - build: transcribing the names, persisting them as an index, loading the
+    index back (a server restart) and building the derived tables
+  - per (format, method): the first search (which builds any lazy tables),
+    then single-query latency p50/p95/p99 and throughput, and batch
+    throughput (search_many where the matcher has it)
+  - peak RSS of the child process
+Queries are typo'd copies of sampled names. Everything is seeded, so two runs
+with the same arguments search the same data with the same queries; only the
+timings should differ. The default dataset is synthetic and needs no network;
+only the formats benchmarked are transcribed, so ARPABET and IPA need NLTK's
+data installed beforehand (python -m app.build_index --download-nltk) while
+e.g. --formats raw Metaphone runs without it.
+
+Usage:
+    python -m app.bench [--sizes 10000 100000 1000000] [--field full] [--queries 100]
+                        [--methods M ...] [--formats F ...] [--source CSV] [--out FILE]
+                        [--compare OLD.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+
+_ONSETS = ["", "b", "br", "c", "ch", "d", "f", "g", "gr", "h", "j", "k", "l", "m", "n",
+           "p", "r", "s", "sh", "st", "t", "th", "v", "w", "z"]
+_VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ie", "ou", "y"]
+_CODAS = ["", "", "n", "r", "l", "s", "th", "ck", "m", "nd", "rt", "x"]
+
+
+def _words(rng: random.Random, n: int, min_syl: int, max_syl: int) -> list[str]:
+    """`n` distinct pronounceable capitalized words."""
+    out: dict[str, None] = {}
+    while len(out) < n:
+        w = "".join(
+            rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS)
+            for _ in range(rng.randint(min_syl, max_syl))
+        )
+        if len(w) > 1:
+            out[w.capitalize()] = None
+    return list(out)
+
+
+def synthetic_names(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    `n` rows of (first, last) names. Tokens come from small vocabularies, as in
+    real data, so G2P runs on thousands of tokens rather than millions.
+    """
+    rng = random.Random(seed)
+    n_first = max(100, int(2 * n ** 0.5))
+    n_last = max(100, -(-n * 2 // n_first))
+    firsts = _words(rng, n_first, 1, 3)
+    lasts = _words(rng, n_last, 2, 4)
+    return pd.DataFrame({
+        settings.col_first: [rng.choice(firsts) for _ in range(n)],
+        settings.col_last: [rng.choice(lasts) for _ in range(n)],
+    })
+
+
+def sampled_names(source: Path, n: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_csv(source, usecols=[settings.col_first, settings.col_last])
+    return df.sample(n=n, replace=n > len(df), random_state=seed).reset_index(drop=True)
+
+
+def typo(rng: random.Random, s: str) -> str:
+    """`s` with one random deletion, insertion, substitution or transposition."""
+    if len(s) < 2:
+        return s
+    i = rng.randrange(len(s) - 1)
+    op = rng.randrange(4)
+    c = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if op == 0:
+        return s[:i] + s[i + 1:]
+    if op == 1:
+        return s[:i] + c + s[i:]
+    if op == 2:
+        return s[:i] + c + s[i + 1:]
+    return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+
+
+def _percentiles(times_ms: list[float]) -> dict:
+    p50, p95, p99 = np.percentile(times_ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def bench_size(size: int, args: argparse.Namespace) -> dict:
+    """All measurements for one dataset size; runs in its own process (see main)."""
+    from app.matchers.base import PreparedQuery, get_matcher, list_matchers
+    from app.services.dataset import build_container, encode_queries, read_names
+    from app.services.executor import run_search
+    from app.services.index_store import build_manifest, load_index, save_index
+    from app.services.metric_index import build_metric_indexes
+    from app.services.segments import build_segment_tables
+
+    if args.formats:
+        # only the requested formats are transcribed, so e.g. --formats raw needs neither G2P nor NLTK data
+        settings.possible_formats = list(args.formats)
+    rng = random.Random(args.seed)
+    build: dict = {}
+    # the loaded index is memory-mapped from here, so keep it for the whole run
+    tmp = tempfile.TemporaryDirectory(prefix="fuzzy-bench-")
+    csv_path = Path(tmp.name) / "names.csv"
+    df = sampled_names(args.source, size, args.seed) if args.source else synthetic_names(size, args.seed)
+    df.to_csv(csv_path, index=False)
+
+    t0 = perf_counter()
+    container, _ = build_container(*read_names(csv_path))
+    build["transcribe_s"] = perf_counter() - t0
+
+    t0 = perf_counter()
+    save_index(container, build_manifest(csv_path), Path(tmp.name) / "index")
+    build["save_index_s"] = perf_counter() - t0
+
+    t0 = perf_counter()
+    container = load_index(Path(tmp.name) / "index")
+    build["load_index_s"] = perf_counter() - t0
+
+    t0 = perf_counter()
+    if settings.metric_index:
+        build_metric_indexes(container)
+    build_segment_tables(container)
+    build["derived_s"] = perf_counter() - t0
+
+    store = container.store(args.field)
+    names = [store.names[i] for i in rng.sample(range(len(store)), min(args.queries, len(store)))]
+    queries = [typo(rng, n).lower() for n in names]
+
+    methods = sorted(args.methods or list_matchers())
+    formats = sorted(args.formats or settings.possible_formats)
+    results = []
+    for format in formats:
+        t0 = perf_counter()
+        encoded = encode_queries(queries, format)
+        encode_ms = (perf_counter() - t0) * 1000.0
+        prepared = [PreparedQuery(text=q, format=format, encoded=encoded[q]) for q in queries]
+        for m in methods:
+            row = {"format": format, "method": m, "encode_ms": encode_ms}
+            try:
+                # the first search pays for lazily built structures; report it apart
+                t0 = perf_counter()
+                run_search(container, args.field, m, prepared[0], format, args.limit, None, {})
+                row["first_ms"] = (perf_counter() - t0) * 1000.0
+
+                times = []
+                for q in prepared:
+                    t0 = perf_counter()
+                    run_search(container, args.field, m, q, format, args.limit, None, {})
+                    times.append((perf_counter() - t0) * 1000.0)
+                row["single"] = {**_percentiles(times), "qps": len(times) / (sum(times) / 1000.0)}
+
+                matcher = get_matcher(m)
+                t0 = perf_counter()
+                if hasattr(matcher, "search_many"):
+                    matcher.search_many(prepared, store, format, args.limit, None, {})
+                else:
+                    for q in prepared:
+                        matcher.search(q, store, format, args.limit, None, {})
+                elapsed = perf_counter() - t0
+                row["batch"] = {"total_ms": elapsed * 1000.0, "qps": len(prepared) / elapsed}
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            results.append(row)
+
+    result = {
+        "size": size,
+        "rows": {f: len(container.store(f)) for f in ("first", "last", "full")},
+        "build": build,
+        "peak_rss_mb": _peak_rss_mb(),
+        "results": results,
+    }
+    del container, store
+    tmp.cleanup()
+    return result
+
+
+def _child(conn, size: int, args: argparse.Namespace) -> None:
+    try:
+        conn.send(bench_size(size, args))
+    except BaseException as e:
+        conn.send({"size": size, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_isolated(size: int, args: argparse.Namespace) -> dict:
+    """bench_size in a fresh process, so peak RSS and caches belong to this size only."""
+    ctx = multiprocessing.get_context("spawn")
+    recv, send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(send, size, args))
+    proc.start()
+    send.close()
+    try:
+        result = recv.recv()
+    except EOFError:
+        result = {"size": size, "error": "benchmark process died"}
+    proc.join()
+    if proc.exitcode:
+        result.setdefault("error", f"benchmark process exited with code {proc.exitcode}")
+    return result
+
+
+def environment() -> dict:
+    versions = {}
+    for pkg in ("rapidfuzz", "numpy", "pandas", "panphon", "g2p_en", "jellyfish"):
+        try:
+            versions[pkg] = metadata.version(pkg)
+        except metadata.PackageNotFoundError:
+            versions[pkg] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": versions,
+        "metric_index": settings.metric_index,
+    }
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """Lines comparing single-query p50 and batch throughput with an earlier run."""
+    def rows(run):
+        return {
+            (s["size"], r["format"], r["method"]): r
+            for s in run["sizes"] for r in s.get("results", []) if "error" not in r
+        }
+    before, lines = rows(old), []
+    for key, r in rows(new).items():
+        o = before.get(key)
+        if o is None:
+            continue
+        p50 = r["single"]["p50_ms"] / o["single"]["p50_ms"] if o["single"]["p50_ms"] else float("nan")
+        qps = r["batch"]["qps"] / o["batch"]["qps"] if o["batch"]["qps"] else float("nan")
+        lines.append(f"{key[0]:>8d} {key[1]:10s} {key[2]:36s} p50 x{p50:5.2f}  batch qps x{qps:5.2f}")
+    return lines
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--field", choices=["first", "last", "full"], default="full")
+    parser.add_argument("--queries", type=int, default=100, help="queries per (format, method)")
+    parser.add_argument("--limit", type=int, default=settings.default_limit)
+    parser.add_argument("--methods", nargs="*", help="default: all registered matchers")
+    parser.add_argument("--formats", nargs="*", help="default: settings.possible_formats")
+    parser.add_argument("--source", type=Path, help="sample names from this CSV instead of generating them")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON of an earlier run to compare against")
+    args = parser.parse_args(argv)
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+
+    run = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "environment": environment(),
+        "sizes": [],
+    }
+    for size in args.sizes:
+        result = run_isolated(size, args)
+        run["sizes"].append(result)
+        if "error" in result:
+            print(f"{size:>8d} rows: {result['error']}")
+            continue
+        b = result["build"]
+        print(
+            f"{size:>8d} rows: transcribe {b['transcribe_s']:.1f}s, load index {b['load_index_s']:.2f}s, "
+            f"derived {b['derived_s']:.1f}s, peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+        for r in result["results"]:
+            if "error" in r:
+                print(f"{'':10s}{r['format']:10s} {r['method']:36s} {r['error']}")
+                continue
+            s = r["single"]
+            print(
+                f"{'':10s}{r['format']:10s} {r['method']:36s} p50 {s['p50_ms']:8.2f} p95 {s['p95_ms']:8.2f} "
+                f"p99 {s['p99_ms']:8.2f} ms  {s['qps']:8.1f} q/s  batch {r['batch']['qps']:8.1f} q/s"
+            )
+
+    if args.out:
+        args.out.write_text(json.dumps(run, indent=2), encoding="utf-8")
+        print(f"Wrote {args.out}")
+    if baseline is not None:
+        print(f"Compared with {args.compare}:")
+        for line in compare(baseline, run):
+            print(line)
+    return 0 if all("error" not in s for s in run["sizes"]) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,58 @@
+"""
+Build the persisted phonetic index offline, so the web app starts by
+memory-mapping it instead of running G2P over every name.
+
+If an index already exists and only the CSV changed, only the new names are
+transcribed; --force rebuilds from scratch. --download-nltk first fetches the
+NLTK data G2P needs into settings.nltk_data_dir (the app never downloads it
+implicitly, see app/services/phonetics.py).
+
+Usage:
+    python -m app.build_index [--data PATH] [--limit N] [--index-dir DIR] [--force] [--download-nltk]
+"""
+
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from app.core.config import settings
+from app.services.index_store import build_index, update_index
+from app.services.phonetics import download_nltk_data
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", type=Path, default=settings.data_path, help="names CSV")
+    parser.add_argument("--limit", type=int, default=settings.preload_limit, help="cap rows read from the CSV")
+    parser.add_argument("--index-dir", type=Path, default=settings.index_dir, help="output directory")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the index is fresh")
+    parser.add_argument("--download-nltk", action="store_true", help="fetch missing NLTK data first")
+    args = parser.parse_args(argv)
+
+    if args.download_nltk:
+        fetched = download_nltk_data()
+        print(f"Downloaded NLTK data {fetched} to {settings.nltk_data_dir}." if fetched else "NLTK data is present.")
+
+    t0 = perf_counter()
+    if args.force:
+        container, mode = build_index(args.data, args.limit, args.index_dir), "rebuild"
+    else:
+        container, stats = update_index(args.data, args.limit, args.index_dir)
+        mode = stats["mode"]
+        if mode == "fresh":
+            print(f"Index in {args.index_dir} is up to date.")
+            return 0
+        if mode == "incremental":
+            print(
+                f"Transcribed {stats['transcribed']} new name(s); added "
+                + ", ".join(f"{f}={n}" for f, n in stats["added"].items())
+            )
+    print(
+        f"Index in {args.index_dir} ({mode}) took {perf_counter() - t0:.1f}s "
+        f"({len(container.df_first)} first, {len(container.df_last)} last, {len(container.df_full)} full names)."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
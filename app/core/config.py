@@ -5,9 +5,67 @@ from pathlib import Path
 class Settings(BaseSettings):
     data_path: Path = Field(default=Path(__file__).resolve().parents[2] / "data" / "celebtest_large_distinct.csv")
     preload_limit: int | None = None  # set to an int to cap rows during dev
+    # persisted phonetic index (see app/services/index_store.py)
+    use_index: bool = True
+    # keep the index frames as Arrow string columns over the mapped files instead of
+    # Python str objects (see load_index); off = plain object columns
+    compact_strings: bool = True
+    debug_dump_dir: Path | None = None  # if set, write the loaded frames there as CSV at startup
+    index_dir: Path = Field(default=Path(__file__).resolve().parents[2] / "data" / "index")
     default_limit: int = 10
     max_limit: int = 100
-    default_score_cutoff: int | None = None
+    default_score_cutoff: float | None = None
+    # candidate generation in front of the matchers (see app/services/candidates.py)
+    default_candidates: str = "full"     # "full" = scan every row
+    default_max_candidates: int = 2000
+    default_recall_target: float = 0.7
+    ngram_size: int = 3
+    length_band_ratio: float = 0.3
+    # pivot metric index for Levenshtein-family matchers (see app/services/metric_index.py)
+    metric_index: bool = False
+    metric_index_pivots: int = 16
+    # rows an intermediate cascade stage keeps unless it says "@N" (see app/matchers/cascade.py)
+    cascade_keep: int = 500
+    # rows each (format, method) list contributes to a fused search (see app/services/fusion.py)
+    fusion_depth: int = 50
+    # PanPhon matchers (see app/services/segments.py)
+    panphon_formats: list[str] = ["IPA"]  # formats whose segment tables are built at load
+    panphon_batch_rows: int = 4096        # rows per feature-edit DP batch
+    # LRU of encoded queries, shared by all matchers of a search
+    query_encoding_cache_size: int = 1024
+    # per (format, method) result cache in MatcherService; size 0 disables it
+    result_cache_size: int = 4096
+    result_cache_ttl_s: float | None = 600
+    # batch search (POST /api/search/batch)
+    max_batch_queries: int = 100_000
+    batch_chunk_size: int = 500          # queries scored (and streamed) per chunk
+    batch_max_cells: int = 10_000_000    # cap on queries x rows per process.cdist call
+    batch_workers: int = -1              # process.cdist threads, -1 = all cores
+    # where MatcherService runs per-method searches (see app/services/executor.py)
+    executor_backend: str = "thread"     # "thread" | "process" | "inline"
+    executor_workers: int | None = None  # None -> os.cpu_count()
+    # scatter full scans over row ranges of the field, one task per range (1 = off)
+    shards: int = 1
+    shard_min_rows: int = 100_000        # fields are split into ranges of at least this many rows
+    method_timeout_ms: float | None = None           # per-method budget; None = wait indefinitely
+    method_timeouts_ms: dict[str, float] = {}        # per-matcher overrides of method_timeout_ms
+    interactive_deadline_ms: float | None = 2000     # whole-search budget of the HTML form; the API takes deadline_ms
+    # per-stage spans and /metrics (see app/services/metrics.py); off = no span timing on the hot path
+    instrumentation: bool = True
+    # evaluation (/eval, python -m app.evaluate)
+    eval_k_values: list[int] = [1, 5, 10]  # accuracy@k reported; top-k is retrieved once for the largest
+    eval_latency_samples: int = 50          # single-query searches timed per (format, method)
+    eval_pr_points: int = 11                # score thresholds on the precision/recall curve
+    eval_corpus_cache_size: int = 4         # evaluation corpora (field + test-set answers) kept between runs
+    eval_jobs_dir: Path = Field(default=Path(__file__).resolve().parents[2] / "data" / "eval_jobs")
+    eval_max_jobs: int = 1                  # evaluations running at once; the rest queue
+    # G2P transcription pool used when building the dataset
+    g2p_workers: int | None = None  # None -> os.cpu_count()
+    g2p_chunk_size: int = 2000      # tokens per pool task
+    g2p_pool_min_tokens: int = 5000  # below this, transcribe in-process
+    # local NLTK data for G2P, searched before NLTK's default paths (see app/services/phonetics.py)
+    nltk_data_dir: Path = Field(default=Path(__file__).resolve().parents[2] / "data" / "nltk_data")
+    nltk_download: bool = False     # fetch missing NLTK resources on first use instead of failing
     # columns
     col_first: str = "first_name"
     col_last: str = "last_name"
@@ -0,0 +1,68 @@
+"""
+Run the /eval evaluation from the command line and export the results, e.g.
+to compare matchers or settings across runs.
+
+The output format follows the --out extension: .json holds everything
+(accuracy@k, MRR, PR curves, latency), .csv one summary row per
+(format, method).
+
+Usage:
+    python -m app.evaluate PAIRS_CSV [--field full] [--methods M ...] [--formats F ...] [--out FILE]
+"""
+
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.dataset import load_dataset
+from app.services.evaluation import evaluate_pairs, results_to_csv, results_to_json
+from app.services.index_store import load_or_build
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pairs", type=Path, help="CSV with misspelled and correct columns")
+    parser.add_argument("--field", choices=["first", "last", "full"], default="full")
+    parser.add_argument("--methods", nargs="*", help="default: all registered matchers")
+    parser.add_argument("--formats", nargs="*", help="default: settings.possible_formats")
+    parser.add_argument("--out", type=Path, help="write results to a .json or .csv file")
+    args = parser.parse_args(argv)
+
+    if args.out and args.out.suffix not in (".json", ".csv"):
+        parser.error("--out must end in .json or .csv")
+
+    if settings.use_index:
+        container = load_or_build(path=settings.data_path, limit=settings.preload_limit)
+    else:
+        container = load_dataset(path=settings.data_path, limit=settings.preload_limit)
+
+    t0 = perf_counter()
+    results = evaluate_pairs(container, args.field, pd.read_csv(args.pairs), args.methods, args.formats)
+    elapsed = perf_counter() - t0
+
+    ks = sorted(settings.eval_k_values)
+    print(f"{'format':10s} {'method':36s} " + " ".join(f"{'@' + str(k):>6s}" for k in ks) + f" {'MRR':>6s} {'p50 ms':>8s}")
+    for fmt in results:
+        for r in fmt["results"]:
+            print(
+                f"{fmt['format']:10s} {r['method']:36s} "
+                + " ".join(f"{r['accuracy_at'][str(k)]:6.1f}" for k in ks)
+                + f" {r['mrr']:6.3f} {r['latency']['p50_ms'] or 0:8.2f}"
+            )
+    print(f"Evaluated {args.pairs.name} on {args.field} in {elapsed:.1f}s.")
+
+    if args.out:
+        if args.out.suffix == ".json":
+            text = results_to_json(results, dataset=args.pairs.name, field=args.field)
+        else:
+            text = results_to_csv(results)
+        args.out.write_text(text, encoding="utf-8")
+        print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
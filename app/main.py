@@ -1,17 +1,24 @@
 from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
 from typing import List, Optional
 
 import anyio
-from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-import pandas as pd
 
 from app.core.config import settings
-from app.services.dataset import load_dataset, DataContainer
+from app.services.dataset import load_dataset, write_debug_dump, DataContainer
+from app.services.index_store import load_or_build
+from app.services.metric_index import build_metric_indexes
+from app.services.segments import build_segment_tables
+from app.services.composite import build_record_index
 from app.services.matcher_service import MatcherService
+from app.services.eval_jobs import EvalJobManager
+from app.services.evaluation import list_test_sets, read_test_set
+from app.services import metrics
 from app.api import router as api_router
 from app.matchers.base import list_matchers
 
@@ -25,12 +32,24 @@ templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: load dataset once and attach service to app.state
-    container: DataContainer = load_dataset(path=settings.data_path, limit=settings.preload_limit)
+    # Startup: load dataset once (from the persisted index when it is fresh) and attach service to app.state
+    if settings.use_index:
+        container: DataContainer = load_or_build(path=settings.data_path, limit=settings.preload_limit)
+    else:
+        container = load_dataset(path=settings.data_path, limit=settings.preload_limit)
+    if settings.metric_index:
+        build_metric_indexes(container)
+    build_segment_tables(container)
+    build_record_index(container)
+    if settings.debug_dump_dir:
+        write_debug_dump(container, settings.debug_dump_dir)
     app.state.data = container
     app.state.matcher_service = MatcherService(container)
+    app.state.eval_jobs = EvalJobManager()
     yield
-    # Shutdown: add cleanup here if needed
+    # Shutdown: stop the matcher workers and any running evaluation
+    app.state.eval_jobs.shutdown()
+    app.state.matcher_service.close()
 
 # Create the FastAPI app AFTER the lifespan definition
 app = FastAPI(title="Fuzzy Name Match Playground", lifespan=lifespan)
@@ -43,6 +62,12 @@ if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Search counters and timing histograms in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ---------- HTML frontend routes ----------
 
 @app.get("/", response_class=HTMLResponse)
@@ -81,16 +106,19 @@ async def search_form(
 
     svc: MatcherService = request.app.state.matcher_service
 
-    results = await anyio.to_thread.run_sync(
-        svc.run_methods,
-        query,        # query
-        field,        # "first" | "last" | "full"
-        methods,      # may be None -> defaults inside service
-        formats,      # may be None -> defaults inside service
-        limit,        # may be any int -> clamped inside service
-        None,         # score_cutoff -> default inside service
-        None          # method_params -> {}
-    )
+    try:
+        results = await anyio.to_thread.run_sync(
+            partial(svc.run_methods, deadline_ms=settings.interactive_deadline_ms),
+            query,        # query
+            field,        # "first" | "last" | "full"
+            methods,      # may be None -> defaults inside service
+            formats,      # may be None -> defaults inside service
+            limit,        # may be any int -> clamped inside service
+            None,         # score_cutoff -> default inside service
+            None          # method_params -> {}
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -106,23 +134,45 @@ async def search_form(
         "base_dataset_length": len(request.app.state.data.df_full),
     })
 
-# ---------- Evaluation page (no API exposure) ----------
+# ---------- Evaluation page ----------
 
-@app.get("/eval", response_class=HTMLResponse)
-async def eval_index(request: Request):
-    test_dir = settings.data_path.parent / "test"
-    datasets = [p.name for p in test_dir.glob("*.csv")] if test_dir.exists() else []
+def _eval_page(request: Request, **ctx):
+    jobs: EvalJobManager = request.app.state.eval_jobs
+    datasets = list_test_sets()
     return templates.TemplateResponse("eval.html", {
         "request": request,
         "datasets": datasets,
         "field": "full",
         "selected_dataset": datasets[0] if datasets else "",
+        "job": None,
         "results": None,
+        "recent_jobs": jobs.list()[:10],
         "error": None,
         "active_tab": "eval",
+        **ctx,
     })
 
 
+@app.get("/eval", response_class=HTMLResponse)
+async def eval_index(request: Request, job: str = ""):
+    """
+    The evaluation form; with ?job=<id>, that job's status and the results
+    finished so far (the page follows a running job over /api/eval/jobs/<id>/events).
+    """
+    if not job:
+        return _eval_page(request)
+    state = request.app.state.eval_jobs.get(job)
+    if state is None:
+        return _eval_page(request, error=f"Unknown evaluation job: {job}")
+    return _eval_page(
+        request,
+        field=state["field"],
+        selected_dataset=state["dataset"],
+        job=state,
+        results=state["results"],
+    )
+
+
 @app.post("/eval", response_class=HTMLResponse)
 async def eval_run(
     request: Request,
@@ -130,56 +180,21 @@ async def eval_run(
     dataset_name: str = Form(""),               # filename from data/test
     upload: UploadFile | None = File(None),     # optional CSV upload
 ):
-    test_dir = settings.data_path.parent / "test"
-    datasets = [p.name for p in test_dir.glob("*.csv")] if test_dir.exists() else []
-
-    # Load pairs CSV (upload has priority)
-    pairs_df = None
-    source = ""
+    """Start a background evaluation job and redirect to its page."""
+    has_upload = bool(upload and upload.filename)
     try:
-        if upload and upload.filename:
-            pairs_df = pd.read_csv(upload.file)
-            source = upload.filename
-        elif dataset_name:
-            pairs_df = pd.read_csv(test_dir / dataset_name)
-            source = dataset_name
+        pairs_df, source = read_test_set(
+            dataset_name, upload.file if has_upload else None, upload.filename if has_upload else ""
+        )
     except Exception as e:
-        return templates.TemplateResponse("eval.html", {
-            "request": request,
-            "datasets": datasets,
-            "field": field,
-            "selected_dataset": dataset_name,
-            "results": None,
-            "error": f"Failed to read dataset: {e}",
-            "active_tab": "eval",
-        })
+        return _eval_page(request, field=field, selected_dataset=dataset_name, error=f"Failed to read dataset: {e}")
 
     if pairs_df is None or pairs_df.empty:
-        return templates.TemplateResponse("eval.html", {
-            "request": request,
-            "datasets": datasets,
-            "field": field,
-            "selected_dataset": dataset_name,
-            "results": None,
-            "error": "Please choose a dataset or upload a CSV.",
-            "active_tab": "eval",
-        })
-
-    # Run evaluation in a worker thread
-    from app.services.evaluation import evaluate_pairs
-    container: DataContainer = request.app.state.data
-    try:
-        results = await anyio.to_thread.run_sync(evaluate_pairs, container, field, pairs_df)
-        error = None
-    except Exception as e:
-        results, error = None, str(e)
+        return _eval_page(request, field=field, selected_dataset=dataset_name,
+                          error="Please choose a dataset or upload a CSV.")
 
-    return templates.TemplateResponse("eval.html", {
-        "request": request,
-        "datasets": datasets,
-        "field": field,
-        "selected_dataset": source or dataset_name,
-        "results": results,
-        "error": error,
-        "active_tab": "eval",
-    })
+    try:
+        job_id = request.app.state.eval_jobs.submit(request.app.state.data, field, pairs_df, dataset=source)
+    except ValueError as e:
+        return _eval_page(request, field=field, selected_dataset=dataset_name, error=str(e))
+    return RedirectResponse(f"/eval?job={job_id}", status_code=303)
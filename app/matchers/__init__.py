@@ -1,13 +1,60 @@
 """
-Automatically import all matcher modules so they register themselves
-via the @register() decorator in base.py.
+Matcher modules register themselves via the @register() decorator in base.py
+and are imported on first use, not with the package.
+
+Which module defines which matcher is found by scanning the modules' source
+(every Python file except base.py and __init__.py) for string literals passed
+to register(...) or _register_matcher(...). So list_matchers() imports
+nothing, and get_matcher(name) imports only the module that registers `name`.
+A matcher registered under a computed name is found by importing every
+module, the first time an unknown name is asked for.
 """
 
+import ast
+import threading
 from importlib import import_module
 from pathlib import Path
 
-# Dynamically import all Python files (except base.py and __init__.py)
 _pkg_path = Path(__file__).parent
-for file in _pkg_path.glob("*.py"):
-    if file.name not in ("__init__.py", "base.py"):
-        import_module(f"{__package__}.{file.stem}")
+_REGISTER_CALLS = {"register", "_register_matcher"}
+_lock = threading.Lock()
+_catalogue: dict[str, str] | None = None
+
+
+def _modules() -> list[str]:
+    return sorted(f.stem for f in _pkg_path.glob("*.py") if f.name not in ("__init__.py", "base.py"))
+
+
+def _registered_names(path: Path) -> list[str]:
+    names = []
+    for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in _REGISTER_CALLS
+            and node.args
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)
+        ):
+            names.append(node.args[0].value)
+    return names
+
+
+def catalogue() -> dict[str, str]:
+    """Matcher name -> module (relative to this package) that registers it."""
+    global _catalogue
+    with _lock:
+        if _catalogue is None:
+            _catalogue = {
+                name: module
+                for module in _modules()
+                for name in _registered_names(_pkg_path / f"{module}.py")
+            }
+        return _catalogue
+
+
+def load_matcher_module(name: str) -> None:
+    """Import the module that registers matcher `name` (all modules if none is known to)."""
+    module = catalogue().get(name)
+    for m in [module] if module else _modules():
+        import_module(f"{__package__}.{m}")
@@ -1,27 +1,84 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Protocol, Iterable, Dict, Any, List
-import pandas as pd
+from typing import Protocol, Iterable, Dict, Any, List, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from app.services.dataset import FieldStore
+
+@dataclass(frozen=True)
+class PreparedQuery:
+    """
+    A query already encoded for one format. MatcherService builds one per
+    (query, format) and hands the same object to every matcher, so phonetic
+    encoding (G2P in particular) runs once per search instead of once per matcher.
+    """
+    text: str     # the query as the user typed it
+    format: str
+    encoded: str  # lowercased and encoded like the format's column
+
+def query_text(query: "str | PreparedQuery", format: str) -> str:
+    """Encoded query for `format`, encoding a plain string on the spot."""
+    if isinstance(query, PreparedQuery) and query.format == format:
+        return query.encoded
+    from app.services.dataset import encode_query
+    return encode_query(query.text if isinstance(query, PreparedQuery) else query, format)
+
+def top_k_rows(scores: np.ndarray, limit: int, score_cutoff) -> np.ndarray:
+    """
+    Row positions of the `limit` best scores, best first, ties broken by row
+    position -- the same order process.extract returns. Shared by matchers
+    that score whole columns into an array.
+    """
+    if score_cutoff is not None:
+        cand = np.flatnonzero(scores >= score_cutoff)
+    else:
+        cand = np.arange(len(scores))
+    if len(cand) > limit:
+        kth = np.partition(scores[cand], len(cand) - limit)[len(cand) - limit]
+        cand = cand[scores[cand] >= kth]
+    order = np.lexsort((cand, -scores[cand]))
+    return cand[order][:limit]
 
 class Matcher(Protocol):
     name: str
+    # rough relative cost of one search (1.0 = a plain fuzz.ratio scan); MatcherService
+    # uses it to start cheap matchers first until it has measured real durations
+    cost_hint: float
+    # best possible score (1.0 if absent); puts scales side by side in score fusion
+    score_max: float
     def search(
             self,
-            query: str,
-            df: pd.DataFrame,
+            query: str | PreparedQuery,
+            store: "FieldStore",
             format: str,
             limit: int,
-            score_cutoff: int,
-            params: Dict[str, Any] | None = None
+            score_cutoff: float,
+            params: Dict[str, Any] | None = None,
+            candidates: np.ndarray | None = None,
+            metric_index: Any = None
         ) -> List[Dict[str, Any]]:
+        """
+        `query` is either a plain string (encoded by the matcher) or a
+        PreparedQuery for `format`; use `query_text` to get the encoded form.
+        `store` is the field's FieldStore (app/services/dataset.py).
+        `candidates`, if given, restricts scoring to those row positions of `store`.
+        `metric_index` (app.services.metric_index.PivotIndex over the same column)
+        may be used to prune rows that cannot reach `score_cutoff`; results must
+        not change.
+        """
         ...
 
 # Simple registry so new matchers auto-discoverable
 _REGISTRY: dict[str, type] = {}
 
-def register(name: str, scorer=None):
+def register(name: str, scorer=None, cost_hint: float | None = None):
     def _wrap(cls):
         cls.name = name
+        if cost_hint is not None:
+            cls.cost_hint = cost_hint
+        elif not hasattr(cls, "cost_hint"):
+            cls.cost_hint = 1.0
         if scorer is not None:
             cls._SCORER = staticmethod(scorer)
         _REGISTRY[name] = cls
@@ -29,10 +86,20 @@ def register(name: str, scorer=None):
     return _wrap
 
 def get_matcher(name: str) -> Matcher:
+    if ">" in name:
+        # a cascade of registered matchers, see app/matchers/cascade.py
+        from app.matchers.cascade import Cascade
+        return Cascade(name)
     cls = _REGISTRY.get(name)
+    if not cls:
+        # matcher modules are imported on first use (see app/matchers/__init__.py)
+        from app.matchers import load_matcher_module
+        load_matcher_module(name)
+        cls = _REGISTRY.get(name)
     if not cls:
         raise ValueError(f"Unknown matcher: {name}")
     return cls()
 
 def list_matchers() -> List[str]:
-    return sorted(_REGISTRY.keys())
+    from app.matchers import catalogue
+    return sorted(set(_REGISTRY) | set(catalogue()))
@@ -0,0 +1,118 @@
+"""
+Cascades: a cheap matcher shortlists rows, more expensive ones rerank them.
+
+A cascade is named in `methods` like any matcher, as stages joined by ">":
+
+    rapidfuzz_Indel@500>rapidfuzz_Wratio
+    rapidfuzz_Indel:Metaphone@1000>rapidfuzz_Indel@200>panphon_sim_dolgo_prime:IPA
+
+Each stage is `method[:format][@keep]`. A stage scores only the rows the
+previous one kept (the first scans the field, or the search's candidate
+shortlist) and keeps its best `keep` (settings.cascade_keep by default).
+The last stage's hits, capped at the search's `limit`, are the result, with
+its scores. `format` defaults to the format the cascade is searched under,
+so stages can mix formats: rows are the same names in every column.
+Intermediate stages run without a score cutoff; the search's `score_cutoff`
+applies to the last stage only, in that stage's scale.
+
+In a composite search each part is scored by the whole cascade, so first or
+last names its earlier stages drop score 0 (see composite._component_scores).
+
+`method_params[<cascade name>]` maps stage method names to their params.
+Each stage is timed as a "cascade" span labelled with its position and the
+stage's matcher spans are labelled the same way (see app/services/metrics.py).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.matchers.base import PreparedQuery, get_matcher
+from app.services.metrics import Trace, current_trace, span
+from app.services.phonetics import get_format
+
+CASCADE_SEP = ">"
+
+
+@dataclass(frozen=True)
+class Stage:
+    method: str
+    format: str | None  # None = the format the cascade is searched under
+    keep: int | None    # None = settings.cascade_keep (last stage: the search's limit)
+
+
+def _parse_stage(text: str) -> Stage:
+    spec, _, keep = text.strip().partition("@")
+    method, _, format = spec.partition(":")
+    if keep and not (keep.isdigit() and int(keep) > 0):
+        raise ValueError(f"Invalid cascade stage {text!r}: keep must be a positive integer")
+    if format:
+        get_format(format)
+    get_matcher(method)  # unknown methods fail here, not halfway through a search
+    return Stage(method, format or None, int(keep) if keep else None)
+
+
+@lru_cache(maxsize=256)
+def parse_cascade(name: str) -> Tuple[Stage, ...]:
+    stages = tuple(_parse_stage(s) for s in name.split(CASCADE_SEP))
+    if len(stages) < 2:
+        raise ValueError(f"A cascade needs at least two stages: {name!r}")
+    return stages
+
+
+class Cascade:
+    """Matcher over a parsed cascade (see the module docstring); get_matcher builds one for a name with ">"."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = parse_cascade(name)
+        # the first stage is the only full scan; the rest score its shortlist
+        self.cost_hint = float(getattr(get_matcher(self.stages[0].method), "cost_hint", 1.0))
+        # scores are the last stage's
+        self.score_max = float(getattr(get_matcher(self.stages[-1].method), "score_max", 1.0))
+
+    def search(
+        self,
+        query: str | PreparedQuery,
+        store,
+        format: str,
+        limit: int,
+        score_cutoff: float,
+        params: Dict[str, Any] | None = None,
+        candidates: np.ndarray | None = None,
+        metric_index=None
+    ) -> List[Dict[str, Any]]:
+        params = params or {}
+        text = query.text if isinstance(query, PreparedQuery) else query
+        hits: List[Dict[str, Any]] = []
+        rows = candidates
+        last = len(self.stages) - 1
+        for i, stage in enumerate(self.stages):
+            fmt = stage.format or format
+            # the shared encoding when the stage scores the search's format, else the matcher encodes
+            q = query if isinstance(query, PreparedQuery) and query.format == fmt else text
+            if i == last:
+                keep = limit if stage.keep is None else min(stage.keep, limit)
+                cutoff = score_cutoff
+            else:
+                keep = stage.keep or settings.cascade_keep
+                cutoff = None
+            outer = current_trace()
+            with span("cascade", stage=i), Trace() as trace:
+                hits = get_matcher(stage.method).search(
+                    q, store, fmt, keep, cutoff, params.get(stage.method),
+                    candidates=rows, metric_index=metric_index if i == last and fmt == format else None
+                )
+            if outer is not None:
+                for s in trace.spans:
+                    outer.add(**{**s, "stage": i})
+            if i < last:
+                if not hits:
+                    return []
+                # ascending, so ties keep the row order of a full scan
+                rows = np.sort(np.fromiter((h["index"] for h in hits), dtype=np.int32, count=len(hits)))
+        return hits
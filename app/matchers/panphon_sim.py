@@ -1,7 +1,17 @@
-import panphon.distance as ppd
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-_dst = ppd.Distance()
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+
+from app.core.config import settings
+from app.matchers.base import register, PreparedQuery, query_text, top_k_rows
+from app.services.dataset import FieldStore, take
+from app.services.metrics import span
+from app.services.segments import SegmentTable, panphon_distance, query_segments, segment_table
+
+# this module loads on the first panphon_sim search (see app/matchers/__init__.py)
+_dst = panphon_distance()
 
 def _seg_len(s: str) -> int:
     """Number of IPA segments (phones) per PanPhon’s feature model."""
@@ -101,3 +111,202 @@ def sim_feature_edit(
         return _sim_length_norm(d, denom, score_cutoff=score_cutoff)
     else:
         raise ValueError("similarity must be 'inverse' or 'length'")
+
+
+# --- registered matchers -------------------------------------------------------
+# Vectorized versions of the three similarities above, scored against the
+# column's precomputed SegmentTable (app/services/segments.py) instead of one
+# Python call per row. Same scores and cutoff semantics; params are the
+# functions' keyword arguments (norm_by, and weighted/similarity for feature edit).
+
+_EPS = 1e-9
+
+
+def _denominators(q: str, q_segs: int, table: SegmentTable, rows: np.ndarray, norm_by: str) -> np.ndarray:
+    if norm_by == "chars":
+        return np.maximum(len(q), table.char_lengths[rows])
+    return np.maximum(q_segs, table.lengths[rows])
+
+
+def _length_norm(d: np.ndarray, denom: np.ndarray) -> np.ndarray:
+    """Vectorized _sim_length_norm without the cutoff."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sim = 1.0 - np.minimum(d / denom, 1.0)
+    return np.where(denom <= 0, 1.0, sim)
+
+
+def _hits(rows: np.ndarray, sims: np.ndarray, store: FieldStore, limit: int, score_cutoff) -> List[Dict[str, Any]]:
+    """Top `limit` of (rows, sims), rows ascending, in process.extract order."""
+    names = store.names
+    return [
+        {"index": int(rows[i]), "match": names[rows[i]], "score": float(sims[i]), "extras": {}}
+        for i in top_k_rows(sims, limit, score_cutoff)
+    ]
+
+
+class _PanphonLevenshteinMatcher:
+    """Levenshtein over the column (or its D' class strings), normalized like panphon_sim."""
+    _DOLGO = False
+    cost_hint = 3.0
+
+    def search(
+        self,
+        query: str | PreparedQuery,
+        store: FieldStore,
+        format: str,
+        limit: int,
+        score_cutoff: float,
+        params: Dict[str, Any] | None = None,
+        candidates: np.ndarray | None = None,
+        metric_index=None
+    ) -> List[Dict[str, Any]]:
+        norm_by = (params or {}).get("norm_by", "segments")
+        q = query_text(query, format)
+        with span("segment_table"):
+            table = segment_table(store, format)
+        rows = store.ids if candidates is None else candidates
+        if self._DOLGO:
+            q_cmp, choices = _dst.map_to_dolgo_prime(q), table.dolgo
+        else:
+            q_cmp, choices = q, store.choices(format)
+        if candidates is not None:
+            choices = take(choices, rows)
+        denom = _denominators(q, _seg_len(q), table, rows, norm_by)
+        max_d = None
+        if score_cutoff is not None and len(denom):
+            # no row needs a distance above this to reach the cutoff; lets RapidFuzz stop early
+            max_d = max(0, int(np.floor((1.0 - score_cutoff) * denom.max() + _EPS)))
+        with span("extract"):
+            d = process.cdist(
+                [q_cmp], choices, scorer=Levenshtein.distance, score_cutoff=max_d,
+                dtype=np.int32, workers=settings.batch_workers
+            )[0]
+            sims = _length_norm(d, denom)
+        with span("format_hits"):
+            return _hits(rows, sims, store, limit, score_cutoff)
+
+    def score_all(
+        self,
+        query: str | PreparedQuery,
+        store: FieldStore,
+        format: str,
+        params: Dict[str, Any] | None = None
+    ) -> np.ndarray:
+        """Similarity to every row of `store`, in row order (see app/services/composite.py)."""
+        norm_by = (params or {}).get("norm_by", "segments")
+        q = query_text(query, format)
+        table = segment_table(store, format)
+        if self._DOLGO:
+            q_cmp, choices = _dst.map_to_dolgo_prime(q), table.dolgo
+        else:
+            q_cmp, choices = q, store.choices(format)
+        with span("extract"):
+            d = process.cdist(
+                [q_cmp], choices, scorer=Levenshtein.distance, dtype=np.int32, workers=settings.batch_workers
+            )[0]
+            return _length_norm(d, _denominators(q, _seg_len(q), table, store.ids, norm_by))
+
+
+@register("panphon_sim_fast_levenshtein")
+class PanphonFastLevenshteinMatcher(_PanphonLevenshteinMatcher):
+    _DOLGO = False
+
+
+@register("panphon_sim_dolgo_prime")
+class PanphonDolgoPrimeMatcher(_PanphonLevenshteinMatcher):
+    _DOLGO = True
+    cost_hint = 10.0
+
+
+@register("panphon_sim_feature_edit")
+class PanphonFeatureEditMatcher:
+    """
+    Feature edit distance with a prefilter: a row whose segment count differs
+    from the query's by k needs at least k insertions/deletions, which bounds
+    its similarity from above. Rows that can't reach score_cutoff are dropped,
+    and the rest are scored best-bound-first, stopping once no unscored row
+    can make the top `limit`.
+    """
+    cost_hint = 100.0
+
+    @staticmethod
+    def _options(params: Dict[str, Any] | None) -> tuple:
+        params = params or {}
+        similarity = params.get("similarity", "inverse")
+        if similarity not in ("inverse", "length"):
+            raise ValueError("similarity must be 'inverse' or 'length'")
+        return params.get("weighted", True), similarity, params.get("norm_by", "segments")
+
+    @staticmethod
+    def _to_sim(d: np.ndarray, rows: np.ndarray, q: str, q_feats: np.ndarray, table: SegmentTable,
+                similarity: str, norm_by: str) -> np.ndarray:
+        if similarity == "inverse":
+            return 1.0 / (1.0 + d)
+        return _length_norm(d, _denominators(q, len(q_feats), table, rows, norm_by))
+
+    def score_all(
+        self,
+        query: str | PreparedQuery,
+        store: FieldStore,
+        format: str,
+        params: Dict[str, Any] | None = None
+    ) -> np.ndarray:
+        """Similarity to every row of `store`, in row order (see app/services/composite.py)."""
+        weighted, similarity, norm_by = self._options(params)
+        q = query_text(query, format)
+        table = segment_table(store, format)
+        _, q_feats = query_segments(q)
+        with span("extract"):
+            d = table.feature_edit_distance(q_feats, store.ids, weighted)
+            return self._to_sim(d, store.ids, q, q_feats, table, similarity, norm_by)
+
+    def search(
+        self,
+        query: str | PreparedQuery,
+        store: FieldStore,
+        format: str,
+        limit: int,
+        score_cutoff: float,
+        params: Dict[str, Any] | None = None,
+        candidates: np.ndarray | None = None,
+        metric_index=None
+    ) -> List[Dict[str, Any]]:
+        weighted, similarity, norm_by = self._options(params)
+
+        q = query_text(query, format)
+        with span("segment_table"):
+            table = segment_table(store, format)
+        _, q_feats = query_segments(q)
+        rows = store.ids if candidates is None else np.asarray(candidates)
+
+        def to_sim(d: np.ndarray, r: np.ndarray) -> np.ndarray:
+            return self._to_sim(d, r, q, q_feats, table, similarity, norm_by)
+
+        bound = to_sim(np.abs(table.lengths[rows] - len(q_feats)) * table.min_indel_cost(q_feats, weighted), rows)
+        if score_cutoff is not None:
+            keep = bound >= score_cutoff - _EPS
+            rows, bound = rows[keep], bound[keep]
+
+        order = np.lexsort((rows, -bound))
+        step = max(1, settings.panphon_batch_rows)
+        done_rows, done_sims = [], []
+        kth = -np.inf
+        with span("extract"):
+            for start in range(0, len(order), step):
+                if bound[order[start]] < kth - _EPS:
+                    break
+                r = rows[order[start:start + step]]
+                done_rows.append(r)
+                done_sims.append(to_sim(table.feature_edit_distance(q_feats, r, weighted), r))
+                sims = np.concatenate(done_sims)
+                if score_cutoff is not None:
+                    sims = sims[sims >= score_cutoff]
+                if len(sims) >= limit:
+                    kth = np.partition(sims, len(sims) - limit)[len(sims) - limit]
+
+        if not done_rows:
+            return []
+        with span("format_hits"):
+            rows, sims = np.concatenate(done_rows), np.concatenate(done_sims)
+            by_row = np.argsort(rows, kind="stable")
+            return _hits(rows[by_row], sims[by_row], store, limit, score_cutoff)
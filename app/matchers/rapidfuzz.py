@@ -1,92 +1,168 @@
 """
 RapidFuzz-based matchers for the fuzzy search app.
 
-Assumes the DataFrame passed in has:
-  - a column "name"    : the original (display) string
-  - a column "name_lc" : the lowercase string used for scoring
+Matchers search a FieldStore (app/services/dataset.py): `store.names` are
+the display strings and `store.choices(format)` the strings scored for
+`format` (lowercased names for raw, else their phonetic encoding).
 
-Each matcher implements .search(query, df, fields, limit, score_cutoff, params=None)
-`fields` is ignored (we always use df["name_lc"]).
+`query` may be a plain string or a PreparedQuery (see base.py).
+
+Each matcher implements
+.search(query, store, format, limit, score_cutoff, params=None, candidates=None, metric_index=None)
+(`candidates`: optional row positions to restrict scoring to, see
+app/services/candidates.py; `metric_index`: optional PivotIndex used by the
+Levenshtein-family scorers to prune by score_cutoff, see
+app/services/metric_index.py) and
+.search_many(queries, store, format, limit, score_cutoff, params=None) and
+.score_all(query, store, format, params=None) -> scores of every row, in row order.
 
 Returns a list of dicts with keys:
-  - index (int): row position in df
-  - match (str): matched string (row["name"])
+  - index (int): row position in the store
+  - match (str): matched display string (store.names[index])
   - score (float): match score
   - extras (dict): extension point
 """
 
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple
-import pandas as pd
-import jellyfish
-from g2p_en import G2p
-from app.services.dataset import name_to_ipa_g2p_en
-from app.matchers.panphon_sim import sim_fast_levenshtein, sim_dolgo_prime, sim_feature_edit
-
-g2p = G2p()
-
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from app.services.dataset import FieldStore
 from rapidfuzz import distance, fuzz, process
-from app.matchers.base import register
+from app.matchers.base import register, PreparedQuery, query_text, top_k_rows
+from app.core.config import settings
+from app.services.metric_index import supports as metric_supports
+from app.services.metrics import span
 
-
-def _format_hits_from_rows(
-    hits: List[Tuple[str, float, int]],
-    df: pd.DataFrame
+def _format_hits_from_scores(
+    scores: np.ndarray,
+    store: FieldStore,
+    limit: int,
+    score_cutoff
 ) -> List[Dict[str, Any]]:
-    """Convert RapidFuzz (match, score, row_pos) tuples into our hit dicts."""
-    out: List[Dict[str, Any]] = []
-    for _match_val, score, row_pos in hits:
-        try:
-            row = df.iloc[row_pos]
-        except Exception:
-            continue
-        out.append({
-            "index": int(row_pos),
-            "match": row["name"],
-            "score": float(score),
-            "extras": {}
-        })
-    return out
+    """Convert one row of a process.cdist score matrix into our hit dicts."""
+    names = store.names
+    return [
+        {"index": int(i), "match": names[i], "score": float(scores[i]), "extras": {}}
+        for i in top_k_rows(scores, limit, score_cutoff)
+    ]
+
+
+# relative per-search cost of the slower scorers (see Matcher.cost_hint); the rest are ~1
+_COST_HINTS = {
+    "rapidfuzz_token_sort_ratio": 3.0,
+    "rapidfuzz_token_set_ratio": 5.0,
+    "rapidfuzz_token_ratio": 6.0,
+    "rapidfuzz_DamerauLevenshtein": 20.0,
+    "rapidfuzz_Wratio": 20.0,
+    "rapidfuzz_partial_ratio": 20.0,
+    "rapidfuzz_partial_token_sort_ratio": 25.0,
+    "rapidfuzz_partial_token_ratio": 30.0,
+    "rapidfuzz_partial_token_set_ratio": 30.0,
+}
 
 
 def _register_matcher(name: str, scorer) -> None:
     """
     Create and register a tiny class bound to a specific RapidFuzz scorer.
     """
-    @register(name, scorer)
+    @register(name, scorer, cost_hint=_COST_HINTS.get(name, 1.0))
     class _RFMatcher:
+        # best possible score: fuzz.* scorers are 0-100, distance.* normalized similarities 0-1
+        score_max = 1.0 if getattr(scorer, "__name__", "") == "normalized_similarity" else 100.0
+
         def search(
             self,
-            query: str,
-            df: pd.DataFrame,
+            query: str | PreparedQuery,
+            store: FieldStore,
             format: str,
             limit: int,
-            score_cutoff: int,
-            params: Dict[str, Any] | None = None
+            score_cutoff: float,
+            params: Dict[str, Any] | None = None,
+            candidates: np.ndarray | None = None,
+            metric_index=None
         ) -> List[Dict[str, Any]]:
-            if format == "raw":
-                choices = df["name_lc"].values
-                q = query.lower()
-            elif format == "Metaphone":
-                choices = df["name_lc_metaphone"].values
-                q= jellyfish.metaphone(query.lower())
-            elif format == "ARPABET":
-                choices = df["name_lc_arpabet"].values
-                q = "".join(g2p(query.lower()))
-            elif format == "IPA":
-                choices = df["name_lc_ipa"].values
-                q = name_to_ipa_g2p_en(query.lower())
+            q = query_text(query, format)
+            if metric_index is not None and not params and metric_supports(self.name, score_cutoff):
+                # Levenshtein-family scorer with a cutoff: prune rows that can't reach it
+                with span("prune"):
+                    candidates = metric_index.prune(self.name, q, score_cutoff, candidates)
+            if candidates is not None:
+                choices = store.subset(format, candidates)
             else:
-                raise ValueError(f"Unknown format: {format}")
-            hits = process.extract(
-                q,
-                choices,
-                scorer=self._SCORER,
-                score_cutoff=score_cutoff,
-                limit=limit,
-                scorer_kwargs=params
-            )
-            return _format_hits_from_rows(hits, df)
+                choices = store.choices(format)
+            with span("extract"):
+                # cdist rather than process.extract (same hits and order): it scores with
+                # the GIL released, so on the thread backend the collecting thread still
+                # wakes at a deadline or method timeout while a long scan runs
+                scores = process.cdist(
+                    [q],
+                    choices,
+                    scorer=self._SCORER,
+                    score_cutoff=score_cutoff,
+                    dtype=np.float64,
+                    workers=1,
+                    scorer_kwargs=params
+                )[0]
+                positions = top_k_rows(scores, limit, score_cutoff)
+            with span("format_hits"):
+                # map shortlist positions back to row positions in the store
+                rows = positions if candidates is None else np.asarray(candidates)[positions]
+                names = store.names
+                return [
+                    {"index": int(row), "match": names[row], "score": float(scores[pos]), "extras": {}}
+                    for pos, row in zip(positions.tolist(), rows.tolist())
+                ]
+
+        def score_all(
+            self,
+            query: str | PreparedQuery,
+            store: FieldStore,
+            format: str,
+            params: Dict[str, Any] | None = None
+        ) -> np.ndarray:
+            """Score against every row of `store`, in row order (see app/services/composite.py)."""
+            q = query_text(query, format)
+            with span("extract"):
+                return process.cdist(
+                    [q],
+                    store.choices(format),
+                    scorer=self._SCORER,
+                    dtype=np.float64,
+                    workers=settings.batch_workers,
+                    scorer_kwargs=params
+                )[0]
+
+        def search_many(
+            self,
+            queries: Sequence[str | PreparedQuery],
+            store: FieldStore,
+            format: str,
+            limit: int,
+            score_cutoff: float,
+            params: Dict[str, Any] | None = None
+        ) -> List[List[Dict[str, Any]]]:
+            """
+            Score many queries in one process.cdist call per chunk (multi-threaded
+            in C++). Chunks are sized so the score matrix stays under
+            settings.batch_max_cells. Same hits, in the same order, as calling
+            .search once per query.
+            """
+            choices = store.choices(format)
+            qs = [query_text(q, format) for q in queries]
+            step = max(1, settings.batch_max_cells // max(1, len(choices)))
+            out: List[List[Dict[str, Any]]] = []
+            for i in range(0, len(qs), step):
+                scores = process.cdist(
+                    qs[i:i + step],
+                    choices,
+                    scorer=self._SCORER,
+                    score_cutoff=score_cutoff,
+                    dtype=np.float64,
+                    workers=settings.batch_workers,
+                    scorer_kwargs=params
+                )
+                out.extend(_format_hits_from_scores(row, store, limit, score_cutoff) for row in scores)
+            return out
 
 # ---- Register built-in RapidFuzz.fuzz scorers ----
 _register_matcher("rapidfuzz_ratio", fuzz.ratio)
@@ -110,7 +186,4 @@ _register_matcher("rapidfuzz_OSA", distance.OSA.normalized_similarity)
 _register_matcher("rapidfuzz_Prefix", distance.Prefix.normalized_similarity)
 _register_matcher("rapidfuzz_Postfix", distance.Postfix.normalized_similarity)
 
-########## register panphon_sim methods
-#_register_matcher("panphon_sim_fast_levenshtein", sim_fast_levenshtein)
-#_register_matcher("panphon_sim_dolgo_prime", sim_dolgo_prime)
-#_register_matcher("panphon_sim_feature_edit", sim_feature_edit)
+# panphon_sim methods are registered in panphon_sim.py
@@ -1,17 +1,55 @@
 from typing import Literal, Optional, Any, Dict, List
 from pydantic import BaseModel, Field
+from app.core.config import settings
 
 FieldChoice = Literal["first", "last", "full"]
 
+class CompositeOptions(BaseModel):
+    """How field="composite" combines the first- and last-name scores (app/services/composite.py)."""
+    mode: Literal["weighted", "either"] = "weighted"
+    first_weight: float = Field(0.5, ge=0)
+    last_weight: float = Field(0.5, ge=0)
+
+class FusionOptions(BaseModel):
+    """One server-side ranking over every (format, method) of the search (app/services/fusion.py)."""
+    mode: Literal["rrf", "weighted"] = "rrf"
+    # "<format>/<method>", "<format>" or "<method>" -> weight (default 1)
+    weights: Dict[str, float] = Field(default_factory=dict)
+    rrf_k: float = Field(60, gt=0)
+    # rows per (format, method) list, at most settings.max_limit (the search limit cap); None = settings.fusion_depth
+    depth: Optional[int] = Field(None, ge=1, le=settings.max_limit)
+
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1)
-    field: FieldChoice = "full"
+    field: Literal["first", "last", "full", "composite"] = "full"
+    composite: CompositeOptions = Field(default_factory=CompositeOptions)
+    # matcher names, or cascades such as "rapidfuzz_Indel@500>rapidfuzz_Wratio" (app/matchers/cascade.py)
     methods: List[str] = Field(...)
     formats: List[str] = Field(...)
     limit: int = 10
-    score_cutoff: int = 70
+    score_cutoff: float = 70  # 0-100 for fuzz.* scorers, 0-1 for distance.* normalized similarities
     method_params: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
     # example: {"rapidfuzz_ratio": {"processor": "identity"}}
+    # candidate generation: "full" scans every row, otherwise a generator from
+    # app/services/candidates.py ("ngram", "length", or a phonetic key such as
+    # "metaphone_key", "soundex_key", "nysiis_key", "match_rating_key")
+    candidates: Optional[str] = None
+    max_candidates: Optional[int] = Field(None, ge=1)
+    recall_target: Optional[float] = Field(None, gt=0, le=1)
+    use_cache: bool = True  # False recomputes and doesn't store the result
+    include_spans: bool = False  # return per-stage timings in SearchResponse.extras["spans"]
+    deadline_ms: Optional[float] = Field(None, ge=0)  # return what finished by then; None = wait for all
+    # if set, results hold only the fused top `limit` (format "fused"); score_cutoff is not applied
+    fusion: Optional[FusionOptions] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    field: FieldChoice = "full"
+    methods: List[str] = Field(...)
+    formats: List[str] = Field(...)
+    limit: int = 10
+    score_cutoff: float = 70
+    method_params: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
 
 class MatchHit(BaseModel):
     index: int
@@ -22,13 +60,56 @@ class MatchHit(BaseModel):
 class MethodResult(BaseModel):
     method: str
     duration_ms: float | None = None
+    status: str = "ok"  # "ok" | "timeout" (still running at the deadline) | "skipped" (never started)
+    cached: bool = False
     hits: List[MatchHit]
 
 class FormatResult(BaseModel):
     format: str
+    candidates: int | None = None  # shortlist size when a candidate generator was used
     methods: List[MethodResult]
 
 class SearchResponse(BaseModel):
     query: str
     fields: List[FieldChoice]
     results: List[FormatResult]
+    extras: Dict[str, Any] = Field(default_factory=dict)  # "spans" when requested
+
+
+class BatchSearchItem(BaseModel):
+    """One NDJSON line of POST /api/search/batch."""
+    query: str
+    results: List[FormatResult]
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_s: float | None
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+class IndexRefreshResponse(BaseModel):
+    mode: Literal["fresh", "incremental", "rebuild"]
+    added: Dict[FieldChoice, int]
+    transcribed: int | None = None  # None for a full rebuild
+    sizes: Dict[FieldChoice, int]
+    duration_ms: float
+
+class EvalJobProgress(BaseModel):
+    done: int
+    total: int  # (format, method) units
+
+class EvalJob(BaseModel):
+    id: str
+    status: Literal["queued", "running", "done", "cancelled", "error", "interrupted"]
+    field: FieldChoice
+    dataset: str = ""
+    created_at: str
+    finished_at: str | None = None
+    progress: EvalJobProgress
+    error: str | None = None
+    version: int = 0
+    # evaluate_pairs output for the units finished so far; omitted in job lists
+    results: List[Dict[str, Any]] | None = None
@@ -0,0 +1,66 @@
+"""
+Small thread-safe LRU cache with a per-entry time-to-live, used by
+MatcherService to reuse results of repeated searches.
+"""
+
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable
+
+
+class TTLCache:
+    """
+    At most `maxsize` entries; an entry older than `ttl_s` seconds counts as a
+    miss. `maxsize=0` disables the cache (every lookup misses, nothing is stored).
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float | None):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl_s is not None and monotonic() - entry[0] > self.ttl_s:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,167 @@
+"""
+Candidate generation ("blocking") in front of the exact matchers.
+
+Every matcher scores the query against every row of a column, so latency
+grows with the dataset. A candidate generator narrows a (field, format)
+column to a shortlist of row positions first; the matchers then run their
+exact scorer over that shortlist only. "full" (no generator) keeps the
+full scan, e.g. to compare results against a blocked search.
+
+Generators register themselves like matchers do:
+
+    @register_generator("ngram")
+    class NgramGenerator:
+        def __init__(self, store, format): ...         # build the index over a FieldStore
+        def candidates(self, query, encoded, max_candidates, recall_target) -> np.ndarray
+
+`query` is the raw query, `encoded` the query in the column's format.
+`candidates` returns sorted row positions, at most `max_candidates` of them.
+Indexes are built lazily on first use and cached per (dataset, field, format)
+by MatcherService.
+"""
+
+from __future__ import annotations
+from collections import defaultdict
+from math import ceil
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.dataset import FieldStore
+from app.services.phonetics import get_encoder, list_formats, split_words
+
+FULL_SCAN = "full"
+
+_GENERATORS: dict[str, type] = {}
+
+
+def register_generator(name: str):
+    def _wrap(cls):
+        cls.name = name
+        _GENERATORS[name] = cls
+        return cls
+    return _wrap
+
+
+def get_generator_class(name: str) -> type:
+    cls = _GENERATORS.get(name)
+    if not cls:
+        raise ValueError(f"Unknown candidate generator: {name}")
+    return cls
+
+
+def list_generators() -> List[str]:
+    return [FULL_SCAN] + sorted(_GENERATORS.keys())
+
+
+def _top_by_affinity(affinity: np.ndarray, cand: np.ndarray, max_candidates: int) -> np.ndarray:
+    """Keep the `max_candidates` rows of `cand` with the highest affinity, returned in row order."""
+    if len(cand) > max_candidates:
+        keep = np.argpartition(-affinity[cand], max_candidates - 1)[:max_candidates]
+        cand = cand[keep]
+    return np.sort(cand)
+
+
+class _InvertedIndex:
+    """key -> int32 array of row positions holding that key."""
+
+    def __init__(self, keys_per_row: Iterable[Iterable[str]], n_rows: int):
+        postings: Dict[str, list] = defaultdict(list)
+        for row, keys in enumerate(keys_per_row):
+            for k in set(keys):
+                postings[k].append(row)
+        self.postings = {k: np.asarray(rows, dtype=np.int32) for k, rows in postings.items()}
+        self.n_rows = n_rows
+
+    def count(self, keys: Iterable[str]) -> np.ndarray:
+        """Number of distinct `keys` each row shares with the query."""
+        counts = np.zeros(self.n_rows, dtype=np.int32)
+        for k in set(keys):
+            rows = self.postings.get(k)
+            if rows is not None:
+                counts[rows] += 1
+        return counts
+
+
+def _ngrams(s: str, n: int) -> List[str]:
+    padded = f" {s} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+@register_generator("ngram")
+class NgramGenerator:
+    """
+    Character n-gram inverted index over the format column. Rows are ranked by
+    how many distinct query n-grams they share. `recall_target` (0-1] sets how
+    many are required: ceil((1 - recall_target) * |query n-grams|), at least one,
+    so 1.0 admits any row sharing a single n-gram.
+    """
+
+    def __init__(self, store: FieldStore, format: str):
+        self.n = settings.ngram_size
+        values = store.choices(format)
+        self.index = _InvertedIndex((_ngrams(v, self.n) for v in values), len(values))
+
+    def candidates(self, query: str, encoded: str, max_candidates: int, recall_target: float) -> np.ndarray:
+        grams = set(_ngrams(encoded, self.n))
+        counts = self.index.count(grams)
+        min_shared = max(1, ceil((1.0 - recall_target) * len(grams)))
+        return _top_by_affinity(counts, np.flatnonzero(counts >= min_shared), max_candidates)
+
+
+class PhoneticKeyGenerator:
+    """
+    Phonetic key buckets: every row is filed under the code of each of its
+    words in `key_format` (a key format, see phonetics.register_encoder), and a
+    query pulls the buckets of its own words' codes. Rows matching more query
+    words rank first. Independent of the scored format. One generator is
+    registered per key format, as "<column suffix>_key" (e.g. "soundex_key").
+    """
+    key_format: str
+
+    def __init__(self, store: FieldStore, format: str):
+        self.encode = get_encoder(self.key_format)
+        codes: Dict[str, str] = {}   # each distinct word is encoded once
+
+        def keys(name: str) -> List[str]:
+            out = []
+            for t in split_words(name):
+                code = codes.get(t)
+                if code is None:
+                    code = codes[t] = self.encode(t)
+                out.append(code)
+            return out
+
+        self.index = _InvertedIndex((keys(v) for v in store.choices("raw")), len(store))
+
+    def candidates(self, query: str, encoded: str, max_candidates: int, recall_target: float) -> np.ndarray:
+        # words split on any non-letter, so "jean-luc" pulls the same buckets as "jean luc"
+        counts = self.index.count(self.encode(t) for t in split_words(query.lower()))
+        return _top_by_affinity(counts, np.flatnonzero(counts > 0), max_candidates)
+
+
+for _f in list_formats():
+    if _f.key:
+        register_generator(f"{_f.column.removeprefix('name_lc_')}_key")(
+            type(f"{_f.name}KeyGenerator", (PhoneticKeyGenerator,), {"key_format": _f.name})
+        )
+
+
+@register_generator("length")
+class LengthBandGenerator:
+    """
+    Rows whose format value length is within settings.length_band_ratio of the
+    encoded query length (at least +-1 character), closest lengths first.
+    """
+
+    def __init__(self, store: FieldStore, format: str):
+        values = store.choices(format)
+        self.lengths = np.fromiter((len(v) for v in values), dtype=np.int32, count=len(values))
+
+    def candidates(self, query: str, encoded: str, max_candidates: int, recall_target: float) -> np.ndarray:
+        band = max(1, ceil(len(encoded) * settings.length_band_ratio))
+        diff = np.abs(self.lengths - len(encoded))
+        return _top_by_affinity(-diff, np.flatnonzero(diff <= band), max_candidates)
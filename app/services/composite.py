@@ -0,0 +1,149 @@
+"""
+Composite first+last search: rank full-name records by scoring the query's
+parts against the first- and last-name stores separately.
+
+The record index maps every row of the full store to the rows of its first
+and last name in their own stores. A composite search for one (format,
+method) then costs
+  - one scan of the first store and one of the last store, both far smaller
+    than the full store (distinct first/last names vs distinct full names);
+  - a NumPy gather of those scores onto the records, combined per record;
+  - a top-k over the combined scores.
+No full-name strings are scored.
+
+Modes:
+  - "weighted": the query's last token is the last name, the rest the first
+    name; score = first_weight * first score + last_weight * last score.
+    A one-word query falls back to "either".
+  - "either": the whole query against both parts, score = the better one.
+A record without one of the parts scores 0 for it.
+"""
+
+from __future__ import annotations
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.matchers.base import PreparedQuery, top_k_rows
+from app.services.dataset import DataContainer, FieldStore, encode_query_cached
+from app.services.metrics import span
+
+COMPOSITE = "composite"
+MODES = ("weighted", "either")
+
+_build_lock = threading.Lock()
+
+
+class RecordIndex:
+    """Full-store row -> (first-store row, last-store row), -1 where a part is missing."""
+
+    def __init__(self, first: FieldStore, last: FieldStore, full: FieldStore):
+        first_row = {n: i for i, n in enumerate(first.names)}
+        last_row = {n: i for i, n in enumerate(last.names)}
+        n = len(full)
+        self.first = np.full(n, -1, dtype=np.int32)
+        self.last = np.full(n, -1, dtype=np.int32)
+        for r, name in enumerate(full.names):
+            # full names are "first last"; try each space as the split (first names can have spaces)
+            start = name.find(" ")
+            while start != -1:
+                f, l = first_row.get(name[:start]), last_row.get(name[start + 1:])
+                if f is not None and l is not None:
+                    self.first[r], self.last[r] = f, l
+                    break
+                start = name.find(" ", start + 1)
+            else:
+                # one-part names: the CSV row had an empty first or last name
+                self.first[r] = first_row.get(name, -1)
+                if self.first[r] < 0:
+                    self.last[r] = last_row.get(name, -1)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+
+def build_record_index(container: DataContainer) -> RecordIndex:
+    """The container's RecordIndex, built on first use."""
+    records = container.records
+    if records is None:
+        with _build_lock:
+            records = container.records
+            if records is None:
+                records = container.records = RecordIndex(container.first, container.last, container.full)
+    return records
+
+
+def split_query(text: str, mode: str) -> tuple[str, str, str]:
+    """(mode actually used, first-name part, last-name part) of a query."""
+    parts = text.split()
+    if mode == "weighted" and len(parts) >= 2:
+        return "weighted", " ".join(parts[:-1]), parts[-1]
+    return "either", text.strip(), text.strip()
+
+
+def _component_scores(matcher, query: PreparedQuery, store: FieldStore, format: str, params) -> np.ndarray:
+    """Score of `query` against every row of `store`, by score_all or a full-length search."""
+    if hasattr(matcher, "score_all"):
+        return np.asarray(matcher.score_all(query, store, format, params), dtype=np.float64)
+    scores = np.zeros(len(store), dtype=np.float64)
+    for h in matcher.search(query, store, format, len(store), None, params):
+        scores[h["index"]] = h["score"]
+    return scores
+
+
+def composite_search(
+    data: DataContainer,
+    matcher,
+    query: PreparedQuery,
+    format: str,
+    limit: int,
+    score_cutoff: float | None,
+    params: Dict[str, Any],
+    options: Dict[str, Any] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Top `limit` full-name records for `query`, as hit dicts with row positions
+    in the full store; extras carry the first/last names and their scores.
+    `options`: {"mode": "weighted" | "either", "first_weight": float, "last_weight": float}.
+    """
+    options = options or {}
+    mode = options.get("mode", "weighted")
+    if mode not in MODES:
+        raise ValueError(f"composite mode must be one of {MODES}")
+    records = build_record_index(data)
+    mode, q_first, q_last = split_query(query.text, mode)
+
+    def prepared(text: str) -> PreparedQuery:
+        return PreparedQuery(text=text, format=format, encoded=encode_query_cached(text.lower(), format))
+
+    first_scores = _component_scores(matcher, prepared(q_first), data.first, format, params)
+    last_scores = _component_scores(matcher, prepared(q_last), data.last, format, params)
+
+    with span("combine"):
+        # index -1 (missing part) reads the appended 0
+        f = np.append(first_scores, 0.0)[records.first]
+        l = np.append(last_scores, 0.0)[records.last]
+        if mode == "weighted":
+            combined = float(options.get("first_weight", 0.5)) * f + float(options.get("last_weight", 0.5)) * l
+        else:
+            combined = np.maximum(f, l)
+
+    with span("format_hits"):
+        names, first_names, last_names = data.full.names, data.first.names, data.last.names
+        hits = []
+        for r in top_k_rows(combined, limit, score_cutoff).tolist():
+            fr, lr = int(records.first[r]), int(records.last[r])
+            hits.append({
+                "index": r,
+                "match": names[r],
+                "score": float(combined[r]),
+                "extras": {
+                    "mode": mode,
+                    "first": first_names[fr] if fr >= 0 else None,
+                    "last": last_names[lr] if lr >= 0 else None,
+                    "first_score": float(f[r]),
+                    "last_score": float(l[r]),
+                },
+            })
+        return hits
@@ -1,44 +1,210 @@
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from typing import Any
+import os
+import threading
+import uuid
+import numpy as np
 import pandas as pd
 from app.core.config import settings
-import jellyfish
-from g2p_en import G2p
-import nltk
-nltk.download('averaged_perceptron_tagger_eng')
-
-arpabet_to_ipa = {
-    "AA": "ɑ", "AE": "æ", "AH": "ʌ", "AO": "ɔ", "AW": "aʊ", "AY": "aɪ",
-    "B": "b", "CH": "tʃ", "D": "d", "DH": "ð", "EH": "ɛ", "ER": "ɝ", "EY": "eɪ",
-    "F": "f", "G": "ɡ", "HH": "h", "IH": "ɪ", "IY": "i", "JH": "dʒ", "K": "k",
-    "L": "l", "M": "m", "N": "n", "NG": "ŋ", "OW": "oʊ", "OY": "ɔɪ",
-    "P": "p", "R": "ɹ", "S": "s", "SH": "ʃ", "T": "t", "TH": "θ",
-    "UH": "ʊ", "UW": "u", "V": "v", "W": "w", "Y": "j", "Z": "z", "ZH": "ʒ"
-}
-
-def arpabet_seq_to_ipa(arpas):
-    ipa = []
-    for sym in arpas:
-        if sym == " ":
-            continue
-        # strip stress digits (e.g., IH1 -> IH)
-        base = ''.join([c for c in sym if not c.isdigit()])
-        ipa.append(arpabet_to_ipa.get(base, base.lower()))
-    return ''.join(ipa)
-
-
-def name_to_ipa_g2p_en(name: str) -> str:
-    arpas = g2p(name)  # returns tokens incl. spaces and ARPABET with stress
-    return arpabet_seq_to_ipa(arpas)
-
-g2p = G2p()
+from app.services.phonetics import (
+    arpabet_seq_to_ipa, g2p, get_encoder, get_format, list_formats, shared_transcriptions,
+)
+
+# columns a per-field frame can carry, in order: the cached formats' columns
+# are transcribed once and persisted (see phonetics.register_encoder)
+PHONETIC_COLUMNS = [f.column for f in list_formats() if f.cached]
+COLUMNS = ["name", "name_lc"] + PHONETIC_COLUMNS
+# column scored for each entry of settings.possible_formats
+FORMAT_COLUMNS = {f.name: f.column for f in list_formats()}
+
+def persisted_formats(formats=None) -> list[str]:
+    """The cached formats among `formats` (settings.possible_formats), in PHONETIC_COLUMNS order."""
+    wanted = set(settings.possible_formats if formats is None else formats)
+    return [f.name for f in list_formats() if f.cached and f.name in wanted]
+
+def phonetic_columns(formats=None) -> list[str]:
+    """Columns transcribed and persisted for `formats` (settings.possible_formats); the rest are never built."""
+    return [FORMAT_COLUMNS[f] for f in persisted_formats(formats)]
+
+def encode_query(query: str, format: str) -> str:
+    """Encode a query the same way the `format` column was encoded."""
+    return get_encoder(format)(query.lower())
+
+@lru_cache(maxsize=settings.query_encoding_cache_size)
+def encode_query_cached(query_lc: str, format: str) -> str:
+    """`encode_query` memoized on the lowercased query (G2P is the expensive part)."""
+    return encode_query(query_lc, format)
+
+class FieldStore:
+    """
+    Immutable, array-backed view of one field for the search hot path.
+
+    Row i is the same name in every sequence, in the row order of the frame it
+    was built from. Sequences are tuples of the frame's own str objects (no
+    copies), which RapidFuzz iterates faster than object ndarrays, and hit
+    formatting is a tuple lookup instead of a DataFrame.iloc per hit.
+    """
+    __slots__ = ("names", "columns", "ids", "derived")
+
+    def __init__(self, names, columns: dict[str, tuple]):
+        self.names: tuple = tuple(names)
+        self.columns: dict[str, tuple] = columns           # format -> encoded strings
+        self.ids = np.arange(len(self.names), dtype=np.int32)
+        # structures derived from the columns, built once per store: (kind, format) -> object
+        self.derived: dict = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "FieldStore":
+        def values(col: str) -> tuple:
+            # to_numpy, not tolist: far faster on Arrow-backed columns (see load_index)
+            return tuple(df[col].to_numpy(dtype=object).tolist())
+
+        # only the configured formats (raw always: candidate generators read it);
+        # an index may carry more columns than are searched
+        columns = {
+            format: values(FORMAT_COLUMNS[format])
+            for format in dict.fromkeys(["raw", *settings.possible_formats])
+            if format in FORMAT_COLUMNS and FORMAT_COLUMNS[format] in df.columns
+        }
+        # uncached formats are cheap: encoded from name_lc here rather than stored
+        for format in settings.possible_formats:
+            if format not in columns and "name_lc" in df.columns:
+                columns[format] = tuple(get_format(format).encode_batch(values("name_lc")))
+        return cls(list(values("name")), columns)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def choices(self, format: str) -> tuple:
+        try:
+            return self.columns[format]
+        except KeyError:
+            raise ValueError(f"Unknown format: {format}") from None
+
+    def subset_names(self, rows: np.ndarray) -> tuple:
+        """Display names of `rows` (row positions), in that order."""
+        return take(self.names, rows)
+
+    def subset(self, format: str, rows: np.ndarray) -> tuple:
+        """Encoded strings of `rows` (row positions), in that order."""
+        return take(self.choices(format), rows)
+
+    def shards(self, count: int) -> list[slice]:
+        """The store's rows as `count` contiguous ranges of near-equal size (fewer if it is smaller)."""
+        n = len(self)
+        k = max(1, min(count, n))
+        bounds = [n * i // k for i in range(k + 1)]
+        return [slice(a, b) for a, b in zip(bounds, bounds[1:])]
+
+
+def take(values: tuple, rows: np.ndarray) -> tuple:
+    """`values` at `rows` (row positions), in that order; a contiguous ascending range is a plain slice."""
+    n = len(rows)
+    if n > 1 and rows[-1] - rows[0] == n - 1 and (n == 2 or bool(np.all(np.diff(rows) == 1))):
+        return values[int(rows[0]):int(rows[-1]) + 1]
+    rows = rows.tolist()
+    if not rows:
+        return ()
+    picked = itemgetter(*rows)(values)
+    return picked if len(rows) > 1 else (picked,)
+
+
+class OverlayStore(FieldStore):
+    """
+    A FieldStore made of some rows of a base store followed by extra names,
+    e.g. the evaluation corpus (a field plus the test set's missing answers).
+
+    The base's strings are shared, not copied: the overlay only holds its own
+    row tuples, which reference the base's str objects. Columns are assembled
+    per format on first use, encoding the extra names at that point, so
+    formats nobody searches cost nothing. `base_rows[i]` is the base row of
+    overlay row i, or -1 for an extra name.
+    """
+    __slots__ = ("base", "base_rows", "extra_lc", "_lock")
+
+    def __init__(self, base: FieldStore, rows: np.ndarray | None, extra_names: list[str]):
+        rows = base.ids if rows is None else np.asarray(rows, dtype=np.int32)
+        names = base.names if len(rows) == len(base) else base.subset_names(rows)
+        super().__init__(names + tuple(extra_names), {})
+        self.base = base
+        self.base_rows = np.concatenate([rows, np.full(len(extra_names), -1, dtype=np.int32)])
+        self.extra_lc = [n.lower() for n in extra_names]
+        self._lock = threading.Lock()
+
+    def choices(self, format: str) -> tuple:
+        col = self.columns.get(format)
+        if col is None:
+            base_col = self.base.choices(format)
+            with self._lock:
+                col = self.columns.get(format)
+                if col is None:
+                    n_base = len(self) - len(self.extra_lc)
+                    rows = self.base_rows[:n_base]
+                    head = base_col if n_base == len(self.base) else self.base.subset(format, rows)
+                    if format == "raw":
+                        tail = tuple(self.extra_lc)
+                    else:
+                        encoded = encode_queries(self.extra_lc, format)
+                        tail = tuple(encoded[q] for q in self.extra_lc)
+                    col = self.columns[format] = head + tail
+        return col
+
 
 @dataclass
 class DataContainer:
     df_first: pd.DataFrame
     df_last: pd.DataFrame
     df_full: pd.DataFrame
+    # (field, format) -> PivotIndex, see app/services/metric_index.py
+    metric_indexes: dict = field(default_factory=dict)
+    # identifies this dataset for caches derived from it (e.g. evaluation corpora)
+    version: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    # full row -> first/last rows, see app/services/composite.py
+    records: Any = None
 
-def load_dataset(path=None, limit=None) -> DataContainer:
+    def __post_init__(self):
+        # columnar stores the matchers read; the frames stay the persisted/ingest form
+        self.first = FieldStore.from_frame(self.df_first)
+        self.last = FieldStore.from_frame(self.df_last)
+        self.full = FieldStore.from_frame(self.df_full)
+
+    def store(self, field: str) -> FieldStore:
+        if field not in ("first", "last", "full"):
+            raise ValueError(f"Unknown field: {field}")
+        return getattr(self, field)
+
+def _encode_queries(args: tuple[list[str], str]) -> list[str]:
+    queries, format = args
+    return [encode_query(q, format) for q in queries]
+
+def encode_queries(queries, format: str, workers: int | None = None) -> dict[str, str]:
+    """
+    `encode_query` for many queries at once: lowercased query -> encoding, each
+    distinct query encoded once. Pooled formats (G2P) fan out over a process
+    pool like `transcribe_tokens`; the rest stay in-process.
+    """
+    unique = list(dict.fromkeys(q.lower() for q in queries))
+    workers = workers or settings.g2p_workers or os.cpu_count() or 1
+    if not get_format(format).pooled or workers <= 1 or len(unique) < settings.g2p_pool_min_tokens:
+        return dict(zip(unique, _encode_queries((unique, format))))
+
+    chunk = max(1, min(settings.g2p_chunk_size, -(-len(unique) // workers)))
+    chunks = [unique[i:i + chunk] for i in range(0, len(unique), chunk)]
+    out: dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part, encoded in zip(chunks, pool.map(_encode_queries, [(c, format) for c in chunks])):
+            out.update(zip(part, encoded))
+    return out
+
+def read_names(path=None, limit=None) -> tuple[pd.Series, pd.Series, pd.Series]:
+    """
+    Read the names CSV and return the (first, last, full) name columns,
+    stripped but not yet deduplicated.
+    """
     path = path or settings.data_path
     df = pd.read_csv(path, nrows=limit)
     col_first, col_last = settings.col_first, settings.col_last
@@ -46,16 +212,113 @@ def load_dataset(path=None, limit=None) -> DataContainer:
     df[col_first] = df[col_first].fillna("").astype(str).str.strip()
     df[col_last] = df[col_last].fillna("").astype(str).str.strip()
     df["full_name"] = (df[col_first] + " " + df[col_last]).str.strip()
+    return df[col_first], df[col_last], df["full_name"]
+
+def _transcribe_tokens(tokens: list[str]) -> list[tuple[str, str]]:
+    """(ARPABET, IPA) per token; runs in pool workers, each loading its own G2P model."""
+    model = g2p()
+    out = []
+    for t in tokens:
+        arpas = model(t)
+        out.append(("".join(arpas), arpabet_seq_to_ipa(arpas)))
+    return out
+
+def transcribe_tokens(tokens: list[str], workers: int | None = None) -> dict[str, tuple[str, str]]:
+    """
+    G2P every token exactly once, fanned out over a process pool (G2P is pure
+    Python/NumPy and holds the GIL). Small batches stay in-process, where the
+    pool start-up would cost more than it saves.
+    """
+    workers = workers or settings.g2p_workers or os.cpu_count() or 1
+    if workers <= 1 or len(tokens) < settings.g2p_pool_min_tokens:
+        return dict(zip(tokens, _transcribe_tokens(tokens)))
+
+    chunk = max(1, min(settings.g2p_chunk_size, -(-len(tokens) // workers)))
+    chunks = [tokens[i:i + chunk] for i in range(0, len(tokens), chunk)]
+    out: dict[str, tuple[str, str]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part, encoded in zip(chunks, pool.map(_transcribe_tokens, chunks)):
+            out.update(zip(part, encoded))
+    return out
+
+def transcribe(names_lc) -> pd.DataFrame:
+    """
+    Phonetic columns (phonetic_columns(), i.e. those of the cached formats in
+    settings.possible_formats) for every unique lowercase name, indexed by
+    name_lc. Formats that aren't configured are never encoded, so a raw-only
+    server never loads G2P.
+
+    Each cached format encodes the whole column in one batch. The G2P formats
+    split names on whitespace and run each distinct token through G2P once,
+    shared between ARPABET and IPA; multi-token names (full names) are
+    assembled from their tokens the same way g2p joins words.
+    """
+    u = pd.Index(pd.unique(pd.Series(names_lc, dtype=object)), name="name_lc")
+    values = list(u)
+    with shared_transcriptions():
+        return pd.DataFrame({
+            get_format(f).column: get_format(f).encode_batch(values) for f in persisted_formats()
+        }, index=u)
+
+def build_frame(names: pd.Series, known: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Deduplicate and sort `names`, then add the lowercase and phonetic columns.
+    Phonetic columns are reused from `known` (a frame with the same columns,
+    e.g. the persisted index) for every name_lc it already has; only the rest
+    are transcribed.
+    """
+    d = pd.DataFrame({ "name": names.drop_duplicates().sort_values() })
+    d["name_lc"] = d["name"].str.lower()
+    columns = phonetic_columns()
+
+    if known is not None and not known.empty:
+        cached = known.drop_duplicates(subset="name_lc").set_index("name_lc")[columns]
+        cached = cached[cached.index.isin(d["name_lc"])]
+    else:
+        cached = pd.DataFrame(columns=columns, index=pd.Index([], name="name_lc"))
+    missing = d.loc[~d["name_lc"].isin(cached.index), "name_lc"]
+    encoded = pd.concat([cached, transcribe(missing)]) if len(missing) else cached
+    return d.join(encoded, on="name_lc")
+
+def build_container(
+    first: pd.Series,
+    last: pd.Series,
+    full: pd.Series,
+    known: pd.DataFrame | None = None,
+) -> tuple[DataContainer, int]:
+    """
+    Build the three per-field frames, transcribing the names of all three
+    fields in a single pass so shared tokens are only converted once.
+    `known` (name_lc + at least the phonetic_columns()) is reused as in `build_frame`.
+    Returns the container and the number of names that had to be transcribed.
+    """
+    names_lc = pd.concat([first, last, full]).str.lower().drop_duplicates()
+    if known is not None and not known.empty:
+        known = known[["name_lc"] + phonetic_columns()].drop_duplicates(subset="name_lc")
+        missing = names_lc[~names_lc.isin(known["name_lc"])]
+        encoded = pd.concat([known, transcribe(missing).reset_index()], ignore_index=True)
+    else:
+        missing = names_lc
+        encoded = transcribe(missing).reset_index()
+
+    container = DataContainer(
+        df_first=build_frame(first, encoded),
+        df_last=build_frame(last, encoded),
+        df_full=build_frame(full, encoded),
+    )
+    return container, len(missing)
+
+def load_dataset(path=None, limit=None) -> DataContainer:
+    first, last, full = read_names(path, limit)
 
     # Deduplicated per-column dataframes
-    df_first = pd.DataFrame({ "name": df[col_first].drop_duplicates().sort_values() })
-    df_last = pd.DataFrame({ "name": df[col_last].drop_duplicates().sort_values() })
-    df_full = pd.DataFrame({ "name": df["full_name"].drop_duplicates().sort_values() })
-
-    for d in [df_first, df_last, df_full]:
-        d["name_lc"] = d["name"].str.lower()
-        d["name_lc_metaphone"] = d["name_lc"].apply(jellyfish.metaphone)
-        d["name_lc_arpabet"] = d["name_lc"].apply(lambda x: "".join(g2p(x)))      # add transformation logic later
-        d["name_lc_ipa"]=d["name_lc"].apply(name_to_ipa_g2p_en)  # add transformation logic later
-        d.to_csv("tmp/debug.csv", index=False)  # DEBUG
-    return DataContainer(df_first=df_first, df_last=df_last, df_full=df_full)
+    container, _ = build_container(first, last, full)
+    return container
+
+
+def write_debug_dump(container: DataContainer, out_dir) -> None:
+    """Write the three frames as first.csv / last.csv / full.csv under `out_dir`, for inspection."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in ("first", "last", "full"):
+        getattr(container, f"df_{name}").to_csv(out_dir / f"{name}.csv", index=False)
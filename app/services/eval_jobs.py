@@ -0,0 +1,174 @@
+"""
+Background evaluation jobs.
+
+An evaluation over a large test set takes minutes, longer than a browser or
+proxy will hold a request open. EvalJobManager runs `iter_evaluate_pairs` on a
+worker thread instead and keeps, per job:
+  - status: queued | running | done | cancelled | error | interrupted
+  - progress: (format, method) units done out of the total
+  - results: finished units so far, grouped like evaluate_pairs' output
+Cancellation is checked between units. The job file (settings.eval_jobs_dir /
+<id>.json) is rewritten after every unit, so a finished job reloads without
+recomputing. A job that was still queued or running when the server stopped
+reads back as "interrupted".
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services.dataset import DataContainer
+from app.services.evaluation import eval_plan, group_results, iter_evaluate_pairs
+
+TERMINAL = ("done", "cancelled", "error", "interrupted")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class _Job:
+    def __init__(self, job_id: str, field: str, dataset: str, total: int):
+        self.cancel = threading.Event()
+        self.future = None
+        self.units: list = []    # [(format, method result)], in completion order
+        self.state: Dict[str, Any] = {
+            "id": job_id,
+            "status": "queued",
+            "field": field,
+            "dataset": dataset,
+            "created_at": _now(),
+            "finished_at": None,
+            "progress": {"done": 0, "total": total},
+            "error": None,
+            "version": 0,        # bumped on every change, for pollers
+        }
+
+
+class EvalJobManager:
+    def __init__(self, jobs_dir: Path | None = None, max_jobs: int | None = None):
+        self.jobs_dir = Path(jobs_dir or settings.eval_jobs_dir)
+        self.pool = ThreadPoolExecutor(max_workers=max_jobs or settings.eval_max_jobs, thread_name_prefix="eval")
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    # ---- submitting / cancelling ----
+
+    def submit(
+        self,
+        container: DataContainer,
+        field: str,
+        pairs_df: pd.DataFrame,
+        dataset: str = "",
+        methods: Optional[List[str]] = None,
+        formats: Optional[List[str]] = None,
+    ) -> str:
+        """Queue an evaluation and return its job id."""
+        if field not in ("first", "last", "full"):
+            raise ValueError(f"Unknown field: {field}")
+        methods, formats = eval_plan(methods, formats)
+        job = _Job(uuid.uuid4().hex[:12], field, dataset, len(methods) * len(formats))
+        with self._lock:
+            self._jobs[job.state["id"]] = job
+        self._save(job)
+        job.future = self.pool.submit(self._run, job, container, pairs_df, methods, formats)
+        return job.state["id"]
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop; False if it is unknown or already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.state["status"] in TERMINAL:
+            return False
+        job.cancel.set()
+        if job.future is not None and job.future.cancel():
+            # never started
+            self._finish(job, "cancelled")
+        return True
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            job.cancel.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---- reading ----
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's state with its results so far, from memory or its job file."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            with self._lock:
+                return {**job.state, "results": group_results(job.units)}
+        return self._load(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries (state without results) of all known jobs, newest first."""
+        jobs: Dict[str, Dict[str, Any]] = {}
+        if self.jobs_dir.exists():
+            for path in self.jobs_dir.glob("*.json"):
+                state = self._load(path.stem)
+                if state is not None:
+                    jobs[state["id"]] = state
+        for job_id, job in list(self._jobs.items()):
+            jobs[job_id] = dict(job.state)
+        summaries = [{k: v for k, v in s.items() if k != "results"} for s in jobs.values()]
+        return sorted(summaries, key=lambda s: s["created_at"], reverse=True)
+
+    # ---- internals ----
+
+    def _run(self, job: _Job, container, pairs_df, methods, formats) -> None:
+        self._update(job, status="running")
+        try:
+            for format, result in iter_evaluate_pairs(container, job.state["field"], pairs_df, methods, formats):
+                with self._lock:
+                    job.units.append((format, result))
+                    job.state["progress"]["done"] += 1
+                self._update(job)
+                if job.cancel.is_set():
+                    self._finish(job, "cancelled")
+                    return
+        except Exception as e:
+            self._finish(job, "error", error=str(e))
+            return
+        self._finish(job, "cancelled" if job.cancel.is_set() else "done")
+
+    def _update(self, job: _Job, **changes) -> None:
+        with self._lock:
+            job.state.update(changes)
+            job.state["version"] += 1
+        self._save(job)
+
+    def _finish(self, job: _Job, status: str, error: str | None = None) -> None:
+        self._update(job, status=status, error=error, finished_at=_now())
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _save(self, job: _Job) -> None:
+        with self._lock:
+            payload = json.dumps({**job.state, "results": group_results(job.units)})
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(job.state["id"])
+        tmp = path.with_suffix(f".json.tmp{threading.get_ident()}")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id.isalnum():
+            return None
+        try:
+            state = json.loads(self._path(job_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if job_id not in self._jobs and state.get("status") not in TERMINAL:
+            # written by a server that stopped before the job finished
+            state["status"] = "interrupted"
+        return state
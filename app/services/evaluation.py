@@ -1,20 +1,25 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+import csv
+import hashlib
+import io
+import json
+import random
+import threading
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import numpy as np
 import pandas as pd
 
-from app.services.dataset import DataContainer
-from app.matchers.base import list_matchers, get_matcher
+from app.services.cache import TTLCache
+from app.services.dataset import DataContainer, FieldStore, OverlayStore, encode_queries
+from app.matchers.base import list_matchers, get_matcher, PreparedQuery
 from app.core.config import settings
-import jellyfish
-from g2p_en import G2p
-from app.services.dataset import name_to_ipa_g2p_en
-
-g2p = G2p()
 
 
 def _pick_col(df: pd.DataFrame, candidates: list[str]) -> Optional[str]:
     """
-    Selects and returns the name of the first column in the DataFrame `df` that matches any of the 
+    Selects and returns the name of the first column in the DataFrame `df` that matches any of the
     provided candidate names (case-insensitive and stripped of leading/trailing whitespace).
 
     Args:
@@ -31,19 +36,181 @@ def _pick_col(df: pd.DataFrame, candidates: list[str]) -> Optional[str]:
     return None
 
 
-def evaluate_pairs(
+def test_dir() -> Path:
+    """Directory of the bundled test sets (data/test next to the names CSV)."""
+    return settings.data_path.parent / "test"
+
+
+def list_test_sets() -> List[str]:
+    d = test_dir()
+    return sorted(p.name for p in d.glob("*.csv")) if d.exists() else []
+
+
+def read_test_set(dataset_name: str = "", upload=None, upload_name: str = "") -> tuple[pd.DataFrame | None, str]:
+    """
+    (pairs frame, source name) from an uploaded CSV file object, which has
+    priority, or a test set in test_dir() by name; (None, "") if neither is given.
+    """
+    if upload is not None:
+        return pd.read_csv(upload), upload_name or "upload.csv"
+    if dataset_name:
+        if dataset_name not in list_test_sets():
+            raise ValueError(f"Unknown test dataset: {dataset_name}")
+        return pd.read_csv(test_dir() / dataset_name), dataset_name
+    return None, ""
+
+
+# (dataset version, field, test-set hash) -> OverlayStore
+_corpora = TTLCache(settings.eval_corpus_cache_size, None)
+_corpora_lock = threading.Lock()
+
+
+def _test_set_hash(correct: pd.Series) -> str:
+    h = hashlib.sha256()
+    for v in correct.drop_duplicates():
+        h.update(v.encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def _eval_store(base: FieldStore, correct: pd.Series) -> FieldStore:
+    """
+    The field's rows plus every 'correct' value it lacks, one row per
+    lowercase name (first occurrence wins, base rows before added ones),
+    as an OverlayStore on `base`; `base` itself when nothing changes.
+    """
+    base_lc = pd.Index(base.choices("raw"))
+    keep = np.flatnonzero(~base_lc.duplicated(keep="first"))
+
+    add = pd.DataFrame({"name": correct.drop_duplicates()})
+    add["name_lc"] = add["name"].str.lower()
+    add = add[~add["name_lc"].isin(base_lc)].drop_duplicates(subset="name_lc", keep="first")
+
+    if len(keep) == len(base) and add.empty:
+        return base
+    return OverlayStore(base, keep, add["name"].tolist())
+
+
+def eval_corpus(container: DataContainer, field: str, correct: pd.Series) -> FieldStore:
+    """
+    `_eval_store` for the container's field, cached by (dataset version, field,
+    hash of the distinct 'correct' values), so rerunning a test set reuses the
+    corpus, its encoded extra names and anything matchers derived from it.
+    """
+    key = (container.version, field, _test_set_hash(correct))
+    store = _corpora.get(key)
+    if store is None:
+        with _corpora_lock:
+            store = _corpora.get(key)
+            if store is None:
+                store = _eval_store(container.store(field), correct)
+                _corpora.set(key, store)
+    return store
+
+
+def _top_k(matcher, queries: List[PreparedQuery], store: FieldStore, format: str, k: int) -> List[List[Dict[str, Any]]]:
+    """Top-k hits (score_cutoff=0) of every query, batched where the matcher supports it."""
+    if hasattr(matcher, "search_many"):
+        return matcher.search_many(queries, store, format, k, 0, {})
+    return [matcher.search(q, store, format, k, 0, {}) for q in queries]
+
+
+def _latency(matcher, queries: List[PreparedQuery], store: FieldStore, format: str, k: int) -> Dict[str, Any]:
+    """p50/p95/p99 of single-query search latency over a fixed sample of `queries`."""
+    n = min(len(queries), settings.eval_latency_samples)
+    if n <= 0:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    sample = random.Random(0).sample(queries, n)
+    times = []
+    for q in sample:
+        t0 = perf_counter()
+        matcher.search(q, store, format, k, 0, {})
+        times.append((perf_counter() - t0) * 1000.0)
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return {"n": n, "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def _pr_curve(top1_scores: np.ndarray, top1_correct: np.ndarray, total: int) -> List[Dict[str, Any]]:
+    """
+    Precision/recall of accepting the top-1 hit only when its score is >= t,
+    for settings.eval_pr_points thresholds spread over the observed scores.
+    """
+    scored = ~np.isnan(top1_scores)
+    if not scored.any():
+        return []
+    lo, hi = float(top1_scores[scored].min()), float(top1_scores[scored].max())
+    curve = []
+    for t in np.unique(np.linspace(lo, hi, max(2, settings.eval_pr_points))):
+        accepted = scored & (top1_scores >= t)
+        n_acc = int(accepted.sum())
+        hits = int((accepted & top1_correct).sum())
+        curve.append({
+            "threshold": float(t),
+            "accepted": n_acc,
+            "precision": hits / n_acc if n_acc else None,
+            "recall": hits / total if total else 0.0,
+        })
+    return curve
+
+
+def _method_metrics(
+    all_hits: List[List[Dict[str, Any]]],
+    query_slots: np.ndarray,
+    truth: np.ndarray,
+    names_cf: np.ndarray,
+) -> Dict[str, Any]:
+    """accuracy@k, MRR and the PR curve for one method from its top-k hits."""
+    total = len(query_slots)
+    ks = sorted(settings.eval_k_values)
+    ranks = np.zeros(total, dtype=np.int64)          # 1-based rank of the truth, 0 = not in top-k
+    top1_scores = np.full(total, np.nan)
+    for i, (slot, t) in enumerate(zip(query_slots.tolist(), truth)):
+        hits = all_hits[slot]
+        if hits:
+            top1_scores[i] = hits[0]["score"]
+        for r, h in enumerate(hits, start=1):
+            if names_cf[h["index"]] == t:
+                ranks[i] = r
+                break
+
+    found = ranks > 0
+    correct = int((ranks == 1).sum())
+    return {
+        "total": total,
+        "correct": correct,
+        "accuracy": (correct / total * 100.0) if total else 0.0,
+        "accuracy_at": {
+            str(k): (float((found & (ranks <= k)).sum()) / total * 100.0) if total else 0.0 for k in ks
+        },
+        "mrr": float(np.where(found, 1.0 / np.maximum(ranks, 1), 0.0).mean()) if total else 0.0,
+        "pr_curve": _pr_curve(top1_scores, ranks == 1, total),
+    }
+
+
+def eval_plan(methods: Optional[List[str]] = None, formats: Optional[List[str]] = None) -> tuple[List[str], List[str]]:
+    """The (methods, formats) an evaluation runs, in run order."""
+    return sorted(methods or list_matchers()), sorted(formats or settings.possible_formats)
+
+
+def iter_evaluate_pairs(
     container: DataContainer,
     field: str,                       # "first" | "last" | "full"
     pairs_df: pd.DataFrame,           # columns like mispelled/misspelled + correct
     methods: Optional[List[str]] = None,
     formats: Optional[List[str]] = None,
-) -> List[Dict[str, Any]]:
+) -> Iterator[tuple[str, Dict[str, Any]]]:
     """
     For each (mispelled, correct) row:
-      - add ALL unique 'correct' values to a temporary copy of the chosen field DF
-      - run each matcher with limit=1, score_cutoff=0
-      - if top-1 match equals 'correct' (case-insensitive), count as correct
-    Returns: [{"method": str, "total": int, "correct": int, "accuracy": float}, ...] (alphabetical by method)
+      - add ALL unique 'correct' values to the chosen field (a cached overlay, see eval_corpus)
+      - run each matcher once per query for its top-k (k = max of
+        settings.eval_k_values), score_cutoff=0
+      - a query is correct at k if a hit within the first k equals 'correct'
+        (case-insensitive); "correct"/"accuracy" are the top-1 numbers
+    Each distinct query is encoded once per format and scored by every method
+    in batches (process.cdist for the RapidFuzz matchers, see search_many).
+    Latency percentiles come from a separate sample of single-query searches.
+    Yields (format, {"method", "total", "correct", "accuracy", "accuracy_at": {"1", "5", "10"},
+    "mrr", "pr_curve": [...], "latency": {...}, "duration_ms"}) as each method
+    finishes, in eval_plan order. Yields nothing for an empty test set.
     """
     # ---- detect columns (accept common spellings/aliases) ----
     left_col = _pick_col(pairs_df, ["mispelled", "misspelled", "typo", "query", "input"])
@@ -56,58 +223,94 @@ def evaluate_pairs(
 
     pairs = pairs_df[[left_col, right_col]].dropna()
     if pairs.empty:
-        return []
+        return
 
     pairs[left_col] = pairs[left_col].astype(str).str.strip()
     pairs[right_col] = pairs[right_col].astype(str).str.strip()
 
-    # ---- choose base DF by field ----
-    if field == "first":
-        base = container.df_first[["name", "name_lc", "name_lc_metaphone", "name_lc_arpabet", "name_lc_ipa"]]
-    elif field == "last":
-        base = container.df_last[["name", "name_lc", "name_lc_metaphone", "name_lc_arpabet", "name_lc_ipa"]]
-    elif field == "full":
-        base = container.df_full[["name", "name_lc", "name_lc_metaphone", "name_lc_arpabet", "name_lc_ipa"]]
-    else:
-        raise ValueError(f"Unknown field: {field}")
-
-    # ---- add 'correct' values temporarily to a copy ----
-    add = pd.DataFrame({"name": pairs[right_col].drop_duplicates()})
-    add["name_lc"] = add["name"].str.lower()
-    add["name_lc_metaphone"] = add["name_lc"].apply(lambda x: jellyfish.metaphone(x))
-    add["name_lc_arpabet"] = add["name_lc"].apply(lambda x: "".join(g2p(x)))
-    add["name_lc_ipa"] = add["name_lc"].apply(name_to_ipa_g2p_en)
-    print("added rows:")
-    print(add)
-    df_eval = pd.concat([base, add], ignore_index=True)
-    df_eval = df_eval.drop_duplicates(subset="name_lc", keep="first").reset_index(drop=True)
-    print("df eval sample:")
-    print(df_eval[100:110])
+    # ---- base store for the field, plus the 'correct' values it lacks ----
+    store = eval_corpus(container, field, pairs[right_col])
 
     # ---- run all/selected methods ----
-    methods = sorted(methods or list_matchers())
-    formats = sorted(formats or settings.possible_formats)
+    methods, formats = eval_plan(methods, formats)
+    k = max(settings.eval_k_values)
+
+    queries_lc = pairs[left_col].str.lower().tolist()
+    unique_lc = list(dict.fromkeys(queries_lc))
+    slot = {q: i for i, q in enumerate(unique_lc)}
+    query_slots = np.fromiter((slot[q] for q in queries_lc), dtype=np.int64, count=len(queries_lc))
+    truth = [t.casefold() for t in pairs[right_col]]
+    names_cf = [n.strip().casefold() for n in store.names]
 
-    results: List[Dict[str, Any]] = []
-    
     for format in formats:
-        format_results: List[Dict[str, Any]] = []
+        encoded = encode_queries(unique_lc, format)
+        prepared = [PreparedQuery(text=q, format=format, encoded=encoded[q]) for q in unique_lc]
         for m in methods:
             matcher = get_matcher(m)
-            correct_cnt = 0
-            total = int(pairs.shape[0])
-
-            for _, row in pairs.iterrows():
-                q = row[left_col]
-                truth = row[right_col]
-                hits = matcher.search(q, df_eval, format, limit=1, score_cutoff=0, params={})
-                if hits and hits[0]["match"].strip().casefold() == truth.strip().casefold():
-                    print(f"{format}, {m}, query is {q}, truth is {truth}, hit is {hits[0]['match']}")
-                    correct_cnt += 1
-
-            acc = (correct_cnt / total * 100.0) if total else 0.0
-            format_results.append({"method": m, "total": total, "correct": correct_cnt, "accuracy": acc})
-        
-        results.append({"format": format, "results": format_results})
-    
+            t0 = perf_counter()
+            all_hits = _top_k(matcher, prepared, store, format, k)
+            duration_ms = (perf_counter() - t0) * 1000.0
+            yield format, {
+                "method": m,
+                **_method_metrics(all_hits, query_slots, truth, names_cf),
+                "latency": _latency(matcher, prepared, store, format, k),
+                "duration_ms": duration_ms,
+            }
+
+
+def group_results(units: Iterable[tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """(format, method result) pairs -> [{"format": str, "results": [...]}], keeping their order."""
+    results: List[Dict[str, Any]] = []
+    for format, r in units:
+        if not results or results[-1]["format"] != format:
+            results.append({"format": format, "results": []})
+        results[-1]["results"].append(r)
     return results
+
+
+def evaluate_pairs(
+    container: DataContainer,
+    field: str,
+    pairs_df: pd.DataFrame,
+    methods: Optional[List[str]] = None,
+    formats: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run iter_evaluate_pairs to completion.
+    Returns: [{"format": str, "results": [{"method", "total", "correct", "accuracy", ...}]}]
+    (alphabetical by format, then method)
+    """
+    return group_results(iter_evaluate_pairs(container, field, pairs_df, methods, formats))
+
+
+# ---- export ----
+
+CSV_COLUMNS = [
+    "format", "method", "total", "correct", "accuracy", "mrr",
+    "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "duration_ms",
+]
+
+
+def results_to_json(results: List[Dict[str, Any]], **meta) -> str:
+    """The full evaluate_pairs output (PR curves included), with optional run metadata."""
+    return json.dumps({**meta, "results": results}, indent=2)
+
+
+def results_to_csv(results: List[Dict[str, Any]]) -> str:
+    """One row per (format, method) with the summary metrics; accuracy@k as accuracy_at_<k> columns."""
+    ks = sorted(settings.eval_k_values)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS[:5] + [f"accuracy_at_{k}" for k in ks] + CSV_COLUMNS[5:])
+    writer.writeheader()
+    for fmt in results:
+        for r in fmt["results"]:
+            lat = r.get("latency", {})
+            writer.writerow({
+                "format": fmt["format"],
+                **{c: r.get(c) for c in ("method", "total", "correct", "accuracy", "mrr", "duration_ms")},
+                **{f"accuracy_at_{k}": r.get("accuracy_at", {}).get(str(k)) for k in ks},
+                "latency_p50_ms": lat.get("p50_ms"),
+                "latency_p95_ms": lat.get("p95_ms"),
+                "latency_p99_ms": lat.get("p99_ms"),
+            })
+    return out.getvalue()
@@ -0,0 +1,252 @@
+"""
+Execution backends for MatcherService.
+
+A search fans out into one task per (format, method). Where those tasks run
+is configured by settings.executor_backend:
+
+  - "thread"  : a thread pool. Cheap to submit to; RapidFuzz releases the GIL
+                in its C++ scorers (the matchers scan with process.cdist), so
+                the collecting thread wakes at a timeout mid-scan, but
+                Python-level work stays serialized.
+  - "process" : a process pool forked from the server process, so each worker
+                inherits the loaded DataContainer copy-on-write instead of
+                receiving it pickled. Tasks carry only the query and options.
+  - "inline"  : run each task immediately in the calling thread (debugging,
+                benchmarks, or hosts where extra threads/processes don't help).
+
+All backends return concurrent.futures.Future objects, so MatcherService can
+apply per-method timeouts the same way for each.
+
+Sharded searches (settings.shards) scatter one (format, method) search over
+contiguous row ranges of the field, one task per range, passed as a slice in
+`candidates` (cheap to send to a worker process);
+`gather` joins the range futures into one Future whose result is
+`merge_shard_results` of theirs, so to MatcherService a sharded search looks
+like any other.
+"""
+
+from __future__ import annotations
+import heapq
+import multiprocessing
+import os
+import threading
+from itertools import islice
+from time import perf_counter
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+from app.matchers.base import get_matcher, PreparedQuery
+from app.services.composite import COMPOSITE, composite_search
+from app.services.dataset import DataContainer
+from app.services.metrics import Trace
+
+
+def run_search(
+    data: DataContainer,
+    field: str,
+    matcher_name: str,
+    query: PreparedQuery,
+    format: str,
+    limit: int,
+    score_cutoff: float | None,
+    params: Dict[str, Any],
+    candidates: np.ndarray | slice | None = None,
+    composite: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """
+    One (format, method) search against `data`; the unit of work every backend
+    runs. `field` "composite" ranks full-name records from first/last scores
+    (app/services/composite.py, options in `composite`). `candidates` is an
+    array of row positions or a slice of rows (a shard). Returns
+    {'method': name, 'duration_ms': float, 'status': 'ok', 'hits': [...], 'spans': [...],
+    'finished_at': float}, timed where it runs so queueing and IPC don't count
+    against the matcher; `spans` are the matcher's stage spans
+    (app/services/metrics.py) and `finished_at` the perf_counter() at the end
+    (system-wide, so comparable across worker processes).
+    """
+    matcher = get_matcher(matcher_name)
+    with Trace() as trace:
+        t0 = perf_counter()
+        if field == COMPOSITE:
+            hits = composite_search(data, matcher, query, format, limit, score_cutoff, params, composite)
+        else:
+            store = data.store(field)
+            if isinstance(candidates, slice):
+                candidates = store.ids[candidates]
+            hits = matcher.search(
+                query, store, format, limit, score_cutoff, params,
+                candidates=candidates, metric_index=data.metric_indexes.get((field, format))
+            )
+        finished_at = perf_counter()
+        duration_ms = (finished_at - t0) * 1000.0
+    return {
+        "method": matcher_name, "duration_ms": duration_ms, "status": "ok", "hits": hits, "spans": trace.spans,
+        "finished_at": finished_at,
+    }
+
+
+def merge_shard_results(results: Sequence[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """
+    One run_search result from those of the same search over ascending row
+    ranges. Each range's hits are ordered best score first, ties by row, and
+    so is the merge, so the top `limit` are exactly those of an unsharded scan.
+    duration_ms is the slowest range's (the critical path when they run in
+    parallel) and finished_at the last range's; spans carry their range's
+    position as "shard".
+    """
+    hits = heapq.merge(*(r["hits"] for r in results), key=lambda h: (-h["score"], h["index"]))
+    return {
+        "method": results[0]["method"],
+        "duration_ms": max(r["duration_ms"] for r in results),
+        "finished_at": max(r["finished_at"] for r in results),
+        "status": "ok",
+        "hits": list(islice(hits, limit)),
+        "spans": [{**s, "shard": i} for i, r in enumerate(results) for s in r.get("spans", [])],
+    }
+
+
+class GatheredFuture(Future):
+    """
+    A Future over several part futures, done when all of them are, with
+    `merge` of their results (or the first part's exception). It can be
+    cancelled only as a whole, i.e. while none of its parts has started.
+    """
+
+    def __init__(self, parts: List[Future], merge: Callable[[List[Any]], Any]):
+        super().__init__()
+        self._parts, self._merge = parts, merge
+        self._pending = len(parts)
+        self._cancelling = False
+        self._lock = threading.Lock()
+        for f in parts:
+            f.add_done_callback(self._part_done)
+
+    def _part_done(self, _part: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if self._pending:
+                return
+        if self._cancelling and all(f.cancelled() for f in self._parts):
+            return  # cancel() finishes this future
+        try:
+            result = self._merge([f.result() for f in self._parts])
+        except CancelledError:
+            # a part started while cancel() was dropping the others: the merge would be incomplete
+            self.set_exception(CancelledError("part of a gathered search was cancelled"))
+        except BaseException as e:
+            self.set_exception(e)
+        else:
+            self.set_result(result)
+
+    def cancel(self) -> bool:
+        # once a part runs, let the rest run too, so the merged result is still cached when it lands
+        if any(f.running() or f.done() for f in self._parts):
+            return False
+        self._cancelling = True
+        if all([f.cancel() for f in self._parts]):
+            return super().cancel()
+        return False
+
+
+def gather(parts: List[Future], merge: Callable[[List[Any]], Any]) -> Future:
+    return parts[0] if len(parts) == 1 else GatheredFuture(parts, merge)
+
+
+# dataset of a process-pool worker, set by fork inheritance (see ProcessBackend)
+_WORKER_DATA: DataContainer | None = None
+
+
+def _init_worker(data: DataContainer) -> None:
+    global _WORKER_DATA
+    _WORKER_DATA = data
+
+
+def _run_search_in_worker(*args) -> Dict[str, Any]:
+    return run_search(_WORKER_DATA, *args)
+
+
+class InlineBackend:
+    def __init__(self, data: DataContainer, workers: int):
+        self.data = data
+
+    def submit(self, data: DataContainer, *args) -> Future:
+        fut: Future = Future()
+        try:
+            fut.set_result(run_search(data, *args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def swap_data(self, data: DataContainer) -> None:
+        self.data = data
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ThreadBackend:
+    def __init__(self, data: DataContainer, workers: int):
+        self.data = data
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="matcher")
+
+    def submit(self, data: DataContainer, *args) -> Future:
+        return self.pool.submit(run_search, data, *args)
+
+    def swap_data(self, data: DataContainer) -> None:
+        self.data = data
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessBackend:
+    """
+    Fork-based process pool. With the "fork" start method the initializer's
+    arguments are inherited rather than pickled, so workers share the parent's
+    dataset pages until they write to them. A dataset swap replaces the pool;
+    tasks already running on the old pool finish against the old dataset.
+    """
+
+    def __init__(self, data: DataContainer, workers: int):
+        self.workers = workers
+        self.data = data
+        self.pool = self._make_pool(data)
+
+    def _make_pool(self, data: DataContainer) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(data,),
+        )
+
+    def submit(self, data: DataContainer, *args) -> Future:
+        if data is not self.data:
+            # the caller resolved a dataset that has since been swapped out; run it
+            # in-process rather than against the workers' (newer) data
+            return InlineBackend(data, 1).submit(data, *args)
+        return self.pool.submit(_run_search_in_worker, *args)
+
+    def swap_data(self, data: DataContainer) -> None:
+        old, self.pool, self.data = self.pool, self._make_pool(data), data
+        old.shutdown(wait=False, cancel_futures=False)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+BACKENDS = {
+    "inline": InlineBackend,
+    "thread": ThreadBackend,
+    "process": ProcessBackend,
+}
+
+
+def make_backend(kind: str, data: DataContainer, workers: int | None = None):
+    try:
+        cls = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown executor backend: {kind}") from None
+    return cls(data, workers or os.cpu_count() or 1)
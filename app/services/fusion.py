@@ -0,0 +1,73 @@
+"""
+Score fusion: one ranking from the hit lists of several (format, method)
+searches of the same query.
+
+MatcherService.run_fused runs every (format, method) as usual, each keeping
+its top `depth` rows, and fuses those lists here:
+  - "rrf" (reciprocal rank fusion): score = sum of weight / (rrf_k + rank)
+    over the lists a row appears in (rank 1 = best). Scores of different
+    scales never mix, so no normalization is needed.
+  - "weighted": score = sum of weight * score / score_max over the lists,
+    i.e. every matcher's score put on a 0-1 scale (see Matcher.score_max).
+    Before fusing, the rows of the shared candidate set (the union of the
+    lists) that a list is missing are scored by that (format, method)
+    restricted to just those rows, so every candidate has every score and
+    none is scored twice (a cascade's by its last stage, whose scores it reports).
+A component's weight is weights["<format>/<method>"] if given, else
+weights[format] * weights[method], each defaulting to 1. Ties rank by row.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Sequence, Tuple
+
+MODES = ("rrf", "weighted")
+
+
+def component(format: str, method: str) -> str:
+    """Key of one (format, method) list in weights and in the fused hits' extras."""
+    return f"{format}/{method}"
+
+
+def component_weight(weights: Dict[str, float], format: str, method: str) -> float:
+    w = weights.get(component(format, method))
+    if w is None:
+        w = weights.get(format, 1.0) * weights.get(method, 1.0)
+    return float(w)
+
+
+def fuse(
+    lists: Sequence[Tuple[str, str, List[Dict[str, Any]], float]],
+    mode: str,
+    weights: Dict[str, float],
+    rrf_k: float,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse `lists` of (format, method, hits best first, score_max) into the top
+    `limit` hits {"index", "match", "score", "extras": {"scores": {component: score}}},
+    where "score" is the fused score and extras holds each list's own score of the row.
+    For "weighted", a list's hits past its depth (filled in for the shared
+    candidate set) count like the rest; for "rrf" ranks are those of the lists.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown fusion mode: {mode}")
+    fused: Dict[int, float] = {}
+    names: Dict[int, str] = {}
+    scores: Dict[int, Dict[str, float]] = {}
+    for format, method, hits, score_max in lists:
+        key = component(format, method)
+        w = component_weight(weights, format, method)
+        for rank, h in enumerate(hits, start=1):
+            row = h["index"]
+            if mode == "rrf":
+                contribution = w / (rrf_k + rank)
+            else:
+                contribution = w * h["score"] / (score_max or 1.0)
+            fused[row] = fused.get(row, 0.0) + contribution
+            names[row] = h["match"]
+            scores.setdefault(row, {})[key] = h["score"]
+    top = sorted(fused, key=lambda row: (-fused[row], row))[:limit]
+    return [
+        {"index": row, "match": names[row], "score": fused[row], "extras": {"scores": scores[row]}}
+        for row in top
+    ]
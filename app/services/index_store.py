@@ -0,0 +1,221 @@
+"""
+Persistent, precomputed phonetic index for the names dataset.
+
+`load_dataset` runs Metaphone and G2P over every name, which takes minutes on
+the full dataset. The index stores the resulting frames on disk so a restart
+only has to memory-map them.
+
+Layout of `settings.index_dir`:
+  - first.arrow / last.arrow / full.arrow : Arrow IPC (Feather v2) files, one per
+    DataContainer frame, uncompressed so they can be memory-mapped
+  - manifest.json : what the index was built from (source CSV hash, row limit,
+    encoder package versions, persisted formats). The index is fresh only if
+    every key matches the manifest we would build now, except that it may
+    carry more formats than settings.possible_formats asks for.
+
+When only the CSV changed, `update_index` diffs it against the persisted
+name_lc sets and transcribes just the new names instead of rebuilding.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from app.core.config import settings
+from app.services.dataset import (
+    DataContainer, load_dataset, persisted_formats, read_names, build_container,
+)
+
+INDEX_VERSION = 1
+FIELDS = ("first", "last", "full")
+MANIFEST_NAME = "manifest.json"
+
+# serializes index writers (startup, CLI, /api/index/refresh)
+_write_lock = threading.Lock()
+
+
+def _arrow_strings(arrow_type: pa.DataType):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _package_version(name: str) -> str | None:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def build_manifest(path: Path | None = None, limit: int | None = None) -> Dict[str, Any]:
+    """Describe the index that `path`/`limit` would produce with the current environment."""
+    path = Path(path or settings.data_path)
+    return {
+        "index_version": INDEX_VERSION,
+        "source_sha256": _sha256(path),
+        "limit": limit,
+        "columns": [settings.col_first, settings.col_last],
+        # the formats whose columns are persisted; the rest are encoded at load
+        "formats": persisted_formats(),
+        "versions": {pkg: _package_version(pkg) for pkg in ("g2p_en", "jellyfish", "nltk")},
+    }
+
+
+def read_manifest(index_dir: Path | None = None) -> Dict[str, Any] | None:
+    index_dir = Path(index_dir or settings.index_dir)
+    try:
+        return json.loads((index_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _matches(manifest: Dict[str, Any], stored: Dict[str, Any], key: str) -> bool:
+    if key == "formats":
+        # an index with more formats than requested serves the requested ones
+        return set(manifest[key]) <= set(stored.get(key) or ())
+    return stored.get(key) == manifest[key]
+
+
+def is_fresh(manifest: Dict[str, Any], index_dir: Path | None = None) -> bool:
+    """True if the index on disk was built from what `manifest` describes (with at least its formats)."""
+    index_dir = Path(index_dir or settings.index_dir)
+    stored = read_manifest(index_dir)
+    if stored is None:
+        return False
+    return all(_matches(manifest, stored, k) for k in manifest) and all(
+        (index_dir / f"{f}.arrow").exists() for f in FIELDS
+    )
+
+
+def is_compatible(manifest: Dict[str, Any], stored: Dict[str, Any] | None) -> bool:
+    """True if an index built as `stored` can be updated incrementally to `manifest` (only the CSV differs)."""
+    if stored is None:
+        return False
+    return all(_matches(manifest, stored, k) for k in manifest if k != "source_sha256")
+
+
+def save_index(container: DataContainer, manifest: Dict[str, Any], index_dir: Path | None = None) -> None:
+    """
+    Write the frames and then the manifest. Every file is written next to its
+    target and renamed into place, and the manifest goes last, so a crashed
+    build leaves an index that reads as stale rather than a half-written one.
+    """
+    index_dir = Path(index_dir or settings.index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    for field in FIELDS:
+        df: pd.DataFrame = getattr(container, f"df_{field}")
+        tmp = index_dir / f"{field}.arrow.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp, compression="uncompressed")
+        os.replace(tmp, index_dir / f"{field}.arrow")
+
+    tmp = index_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps({**manifest, "built_at": datetime.now(timezone.utc).isoformat()}, indent=2))
+    os.replace(tmp, index_dir / MANIFEST_NAME)
+
+
+def load_index(index_dir: Path | None = None) -> DataContainer:
+    """
+    Memory-map the Arrow files of an existing index into a DataContainer.
+    With settings.compact_strings the frames keep Arrow string columns backed
+    by the mapped files instead of converting every cell to a Python str; the
+    only Python strings are then the ones in the FieldStores.
+    """
+    index_dir = Path(index_dir or settings.index_dir)
+    types_mapper = _arrow_strings if settings.compact_strings else None
+    frames = {
+        field: feather.read_table(index_dir / f"{field}.arrow", memory_map=True).to_pandas(types_mapper=types_mapper)
+        for field in FIELDS
+    }
+    return DataContainer(df_first=frames["first"], df_last=frames["last"], df_full=frames["full"])
+
+
+def _compacted(container: DataContainer, index_dir: Path | None) -> DataContainer:
+    """A freshly built container as load_index would return it, so a build costs no more memory than a restart."""
+    return load_index(index_dir) if settings.compact_strings else container
+
+
+def build_index(
+    path: Path | None = None,
+    limit: int | None = None,
+    index_dir: Path | None = None,
+    manifest: Dict[str, Any] | None = None,
+) -> DataContainer:
+    """Build the dataset from the CSV and persist it as the index."""
+    manifest = manifest or build_manifest(path, limit)
+    container = load_dataset(path=path, limit=limit)
+    save_index(container, manifest, index_dir)
+    return _compacted(container, index_dir)
+
+
+def update_index(
+    path: Path | None = None,
+    limit: int | None = None,
+    index_dir: Path | None = None,
+) -> Tuple[DataContainer, Dict[str, Any]]:
+    """
+    Bring the index up to date with the CSV at `path` as cheaply as possible:
+      - fresh index       -> just load it
+      - only CSV changed  -> re-read the CSV, reuse the persisted transcriptions
+                             for every known name_lc, transcribe only new names
+      - anything else     -> full rebuild
+    Returns (container, stats) where stats reports the mode used, how many names
+    each field gained and how many distinct names had to be transcribed.
+    """
+    index_dir = Path(index_dir or settings.index_dir)
+    with _write_lock:
+        manifest = build_manifest(path, limit)
+        stored = read_manifest(index_dir)
+        if is_fresh(manifest, index_dir):
+            return load_index(index_dir), {"mode": "fresh", "added": dict.fromkeys(FIELDS, 0), "transcribed": 0}
+
+        if not is_compatible(manifest, stored):
+            container = build_index(path, limit, index_dir, manifest)
+            sizes = {f: len(getattr(container, f"df_{f}")) for f in FIELDS}
+            return container, {"mode": "rebuild", "added": sizes, "transcribed": None}
+
+        base = load_index(index_dir)
+        first, last, full = read_names(path, limit)
+        known = pd.concat([base.df_first, base.df_last, base.df_full], ignore_index=True)
+        container, transcribed = build_container(first, last, full, known=known)
+        added = {
+            f: int((~getattr(container, f"df_{f}")["name"].isin(getattr(base, f"df_{f}")["name"])).sum())
+            for f in FIELDS
+        }
+        save_index(container, manifest, index_dir)
+        return _compacted(container, index_dir), {"mode": "incremental", "added": added, "transcribed": transcribed}
+
+
+def load_or_build(
+    path: Path | None = None,
+    limit: int | None = None,
+    index_dir: Path | None = None,
+    force: bool = False,
+) -> DataContainer:
+    """
+    Load the persisted index if it is fresh for `path`/`limit`, otherwise
+    update it from the CSV (and persist the result for the next start).
+    `force` skips the incremental path and rebuilds everything.
+    """
+    if force:
+        with _write_lock:
+            return build_index(path, limit, index_dir)
+    container, _stats = update_index(path, limit, index_dir)
+    return container
@@ -1,8 +1,24 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any
+import json
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import partial
+from time import perf_counter
+from typing import List, Dict, Any, Iterator, Sequence, Tuple
 
-from app.matchers.base import get_matcher
-from app.services.dataset import DataContainer
+import numpy as np
+
+from app.core.config import settings
+from app.matchers.base import get_matcher, PreparedQuery
+from app.matchers.cascade import CASCADE_SEP, parse_cascade
+from app.services.cache import TTLCache
+from app.services.candidates import FULL_SCAN, get_generator_class
+from app.services.composite import COMPOSITE
+from app.services.dataset import DataContainer, FieldStore, encode_query, encode_query_cached
+from app.services.executor import gather, make_backend, merge_shard_results
+from app.services.fusion import MODES as FUSION_MODES, fuse
+from app.services import metrics
+from app.services.metrics import Trace, span
+from app.services.phonetics import get_encoder, get_format
 
 
 class MatcherService:
@@ -12,48 +28,95 @@ class MatcherService:
 
     def __init__(self, data: DataContainer):
         self.data = data
-        self.executor = ThreadPoolExecutor(max_workers=4)
-
-    def _get_df_by_field(self, field: str):
-        if field == "first":
-            return self.data.df_first
-        elif field == "last":
-            return self.data.df_last
-        elif field == "full":
-            return self.data.df_full
-        else:
-            raise ValueError(f"Unknown field: {field}")
-
-    def _run_single_matcher_single_format(
-        self, matcher_name: str, df, query: str, format: str,
-        limit: int, score_cutoff: int, params: dict
-    ):
-        """Run one matcher and return {'method': name, 'duration_ms': float, 'hits': [...]}."""
-        from time import perf_counter
-        matcher = get_matcher(matcher_name)
-        t0 = perf_counter()
-        hits = matcher.search(query, df, format, limit, score_cutoff, params)
-        duration_ms = (perf_counter() - t0) * 1000.0
-        return {"method": matcher_name, "duration_ms": duration_ms, "hits": hits}
+        # thread / process / inline pool the per-method searches run on
+        self.backend = make_backend(settings.executor_backend, data, settings.executor_workers)
+        # (generator, field, format) -> (store the index was built from, generator instance)
+        self._candidate_indexes: Dict[Tuple[str, str, str], Tuple[Any, Any]] = {}
+        self._candidate_lock = threading.Lock()
+        # per (format, method) search results; keys carry data_version so results
+        # computed against a dataset that was swapped out are never served
+        self.cache = TTLCache(settings.result_cache_size, settings.result_cache_ttl_s)
+        self.data_version = 0
+        # (method, format) -> moving average of duration_ms, for cheapest-first scheduling
+        self._costs: Dict[Tuple[str, str], float] = {}
+        # format (None = any) -> moving average of measured ms per cost_hint unit
+        self._unit_ms: Dict[str | None, float] = {}
 
-    def run_methods(
-        self,
-        query: str,
-        field: str,
-        methods: List[str] | None = None,
-        formats: list[str] | None = None,
-        limit: int | None = None,
-        score_cutoff: int | None = None,
-        method_params: Dict[str, Dict[str, Any]] | None = None,
-    ) -> List[Dict[str, Any]]:
+    def swap_data(self, data: DataContainer) -> None:
+        """
+        Point the service at a new dataset without a restart. Searches already
+        running keep the frames they started with; new ones see `data`.
+        """
+        self.data = data
+        self.data_version += 1
+        self.backend.swap_data(data)
+        self.cache.clear()
+        with self._candidate_lock:
+            self._candidate_indexes.clear()
+
+    def close(self) -> None:
+        """Stop the execution backend's workers."""
+        self.backend.shutdown()
+
+    def _get_store(self, field: str, data: DataContainer | None = None) -> FieldStore:
+        return (data or self.data).store(field)
+
+    def _candidate_generator(self, name: str, field: str, store: FieldStore, format: str):
+        """Cached candidate index for (name, field, format), rebuilt if `store` changed."""
+        key = (name, field, format)
+        cached = self._candidate_indexes.get(key)
+        if cached is None or cached[0] is not store:
+            with self._candidate_lock:
+                cached = self._candidate_indexes.get(key)
+                if cached is None or cached[0] is not store:
+                    cached = (store, get_generator_class(name)(store, format))
+                    self._candidate_indexes[key] = cached
+        return cached[1]
+
+    @staticmethod
+    def prepare_query(query: str, format: str) -> PreparedQuery:
+        """Encode `query` for `format` once for all matchers of a search (memoized for cached formats)."""
+        encode = encode_query_cached if get_format(format).cached else encode_query
+        return PreparedQuery(text=query, format=format, encoded=encode(query.lower(), format))
+
+    def _candidates(
+        self, generator: str, field: str, store: FieldStore, query: PreparedQuery,
+        max_candidates: int, recall_target: float
+    ) -> np.ndarray | None:
+        """Row positions to score for this query/format, or None for a full scan."""
+        if generator == FULL_SCAN:
+            return None
+        gen = self._candidate_generator(generator, field, store, query.format)
+        return gen.candidates(query.text, query.encoded, max_candidates, recall_target)
+
+    @staticmethod
+    def _shards(store: FieldStore | None, cands: np.ndarray | None, method: str) -> List[slice] | None:
         """
-        Run multiple matchers concurrently in separate threads.
-        Applies sensible defaults if args are missing.
-        Returns list of {"method": matcher_name, "hits": [...]}, one per method.
-        Deterministic result order (alphabetical by method name).
+        Row ranges to scatter a full scan of `store` over (settings.shards), or None to search it whole.
+        Cascades aren't split: each range would keep its own shortlist, so the merge wouldn't match one scan.
         """
+        if store is None or cands is not None or settings.shards <= 1 or CASCADE_SEP in method:
+            return None
+        count = min(settings.shards, len(store) // max(1, settings.shard_min_rows))
+        return store.shards(count) if count > 1 else None
+
+    @staticmethod
+    def _cache_key(data_version, query, field, format, method, limit, score_cutoff, params, candidates, composite=None):
+        return (
+            data_version, query.lower(), field, format, method, limit, score_cutoff,
+            json.dumps(params, sort_keys=True, default=str), candidates,
+            json.dumps(composite, sort_keys=True) if composite else None,
+        )
+
+    @staticmethod
+    def _method_timeout_s(method: str) -> float | None:
+        """Time budget for one method, from settings (None = no limit)."""
+        ms = settings.method_timeouts_ms.get(method, settings.method_timeout_ms)
+        return None if ms is None else ms / 1000.0
+
+    def _normalize_args(self, methods, formats, limit, score_cutoff, method_params):
+        """Apply the defaults/clamping shared by run_methods and run_batch."""
         from app.matchers.base import list_matchers
-        from app.core.config import settings
 
         # --- tidy normalization helpers (scoped to this function) ---
         def coerce_int(val, default):
@@ -62,30 +125,405 @@ class MatcherService:
             except (TypeError, ValueError):
                 return default
 
+        def coerce_float(val, default):
+            try:
+                return float(val)
+            except (TypeError, ValueError):
+                return default
+
         def clamp(n, lo, hi):
             return max(lo, min(n, hi))
 
-        # --- normalize inputs ---
         methods = methods or list_matchers()
         methods = sorted(methods)  # enforce deterministic alphabetical order
+        formats = formats or settings.default_format
+        # fail before anything is submitted: unknown matchers, malformed cascades, formats not loaded.
+        # Resolving also loads the matcher modules and the formats' models on first use, so that
+        # one-off cost is paid here, before a search's deadline clock starts
+        for m in methods:
+            get_matcher(m)
+        for f in formats:
+            if f not in settings.possible_formats:
+                raise ValueError(f"Unknown format: {f}")
+            get_encoder(f)
         limit = clamp(coerce_int(limit, settings.default_limit), 1, settings.max_limit)
-        score_cutoff = coerce_int(score_cutoff, settings.default_score_cutoff)
+        score_cutoff = coerce_float(score_cutoff, settings.default_score_cutoff)
         method_params = method_params or {}
+        return methods, formats, limit, score_cutoff, method_params
 
-        df = self._get_df_by_field(field)
+    def run_methods(
+        self,
+        query: str,
+        field: str,
+        methods: List[str] | None = None,
+        formats: list[str] | None = None,
+        limit: int | None = None,
+        score_cutoff: float | None = None,
+        method_params: Dict[str, Dict[str, Any]] | None = None,
+        candidates: str | None = None,
+        max_candidates: int | None = None,
+        recall_target: float | None = None,
+        use_cache: bool = True,
+        deadline_ms: float | None = None,
+        composite: Dict[str, Any] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run multiple matchers concurrently on the configured execution backend
+        (settings.executor_backend). Applies sensible defaults if args are missing.
+        `candidates` names a candidate generator (app/services/candidates.py);
+        its shortlist is computed once per format and shared by all methods.
+        "full" scores every row.
+        Results are cached per (format, method) unless `use_cache` is False;
+        cached entries come back with "cached": True.
+        A method that misses its time budget (settings.method_timeout_ms /
+        method_timeouts_ms, counted from submission) comes back with
+        "status": "timeout", no hits and duration_ms None; the others are unaffected.
+        `deadline_ms` bounds the whole call, counted once the arguments are
+        resolved (the first use of a matcher or phonetic model loads it before
+        the clock starts, as the load can't be cut short): the (format,
+        method) searches are all submitted up front, cheapest first (see
+        estimated_cost), and whatever hasn't finished by the deadline comes back
+        as "timeout" (it was running; its result is still cached when it lands)
+        or "skipped" (it never started). The inline backend runs each search as
+        it is submitted, so there the one running at the deadline finishes and
+        the rest are skipped. None waits for everything.
+        `field` "composite" ranks full-name records from separate first- and
+        last-name scores (app/services/composite.py; `composite` holds its mode
+        and weights); it always scans, ignoring `candidates`.
+        With settings.shards > 1, a full scan of a large field is split into
+        row ranges searched as separate tasks and their top hits merged; the
+        hits and their order are the same as for one scan (see executor.gather).
+        Returns list of {"format", "candidates", "results": [{"method", "duration_ms", "status", "hits", "cached"}],
+        "spans": [{"name", "ms", "method"?}]}, one per format. Deterministic result
+        order (alphabetical by method name). Spans (empty with settings.instrumentation
+        off) cover cache lookup, query encoding, candidate generation, per-method
+        queueing ("queue": waiting for a worker plus sending it the task) and the matchers' own stages.
+        """
+        # --- normalize inputs ---
+        methods, formats, limit, score_cutoff, method_params = self._normalize_args(
+            methods, formats, limit, score_cutoff, method_params
+        )
+        started = perf_counter()
+        deadline = None if deadline_ms is None else started + max(0.0, float(deadline_ms)) / 1000.0
+
+        candidates = FULL_SCAN if field == COMPOSITE else (candidates or settings.default_candidates)
+        max_candidates = max(1, int(max_candidates or settings.default_max_candidates))
+        recall_target = min(1.0, max(0.0, float(recall_target or settings.default_recall_target)))
+        composite = (composite or None) if field == COMPOSITE else None
 
-        # start all tasks concurrently
-        results=[]
+        # resolve once so a concurrent swap_data can't mix datasets
+        data, data_version = self.data, self.data_version
+        store = None if field == COMPOSITE else self._get_store(field, data)
+        candidate_spec = (candidates,) if candidates == FULL_SCAN else (candidates, max_candidates, recall_target)
+
+        # --- per format: cached results, query encoding, candidate shortlist ---
+        plans = []
         for format in formats:
-            futures = {
-                m: self.executor.submit(
-                    self._run_single_matcher_single_format,
-                    m, df, query, format, limit, score_cutoff, method_params.get(m, {})
+            trace = Trace()
+            keys, cached = {}, {}
+            cands = prepared = None
+            with trace:
+                if use_cache:
+                    with span("cache_lookup"):
+                        for m in methods:
+                            keys[m] = self._cache_key(
+                                data_version, query, field, format, m, limit, score_cutoff,
+                                method_params.get(m, {}), candidate_spec, composite
+                            )
+                            hit = self.cache.get(keys[m])
+                            if hit is not None:
+                                cached[m] = {**hit, "cached": True}
+                missing = [m for m in methods if m not in cached]
+                if missing and (deadline is None or perf_counter() < deadline):
+                    with span("encode"):
+                        prepared = self.prepare_query(query, format)
+                    with span("candidates"):
+                        cands = self._candidates(candidates, field, store, prepared, max_candidates, recall_target)
+            plans.append({"format": format, "trace": trace, "keys": keys, "cached": cached,
+                          "missing": missing, "prepared": prepared, "cands": cands})
+
+        # --- start every search, cheapest first, so a deadline cuts the expensive tail ---
+        tasks = [(p, m) for p in plans if p["prepared"] is not None for m in p["missing"]]
+        tasks.sort(key=lambda t: self.estimated_cost(t[1], t[0]["format"]))
+        submitted, submitted_at, futures = perf_counter(), {}, {}
+        for p, m in tasks:
+            if deadline is not None and perf_counter() >= deadline:
+                break  # the rest come back "skipped" (the inline backend runs each task right here)
+            key = (p["format"], m)
+            submitted_at[key] = perf_counter()
+            args = (data, field, m, p["prepared"], p["format"], limit, score_cutoff, method_params.get(m, {}))
+            shards = self._shards(store, p["cands"], m)
+            if shards:
+                futures[key] = gather(
+                    [self.backend.submit(*args, rows, composite) for rows in shards],
+                    partial(merge_shard_results, limit=limit),
                 )
-                for m in methods
-            }
+            else:
+                futures[key] = self.backend.submit(*args, p["cands"], composite)
+
+        # --- collect results in the fixed order ---
+        results = []
+        for p in plans:
+            format, trace = p["format"], p["trace"]
+            format_results = []
+            for m in methods:
+                if m in p["cached"]:
+                    format_results.append(p["cached"][m])
+                    continue
+                fut = futures.get((format, m))
+                if fut is None:
+                    # the deadline passed before this format's query was even encoded
+                    format_results.append({"method": m, "duration_ms": None, "status": "skipped", "hits": []})
+                    continue
+                timeout = self._method_timeout_s(m)
+                until = None if timeout is None else submitted + timeout
+                if deadline is not None:
+                    until = deadline if until is None else min(until, deadline)
+                try:
+                    r = fut.result(timeout=None if until is None else max(0.0, until - perf_counter()))
+                except FutureTimeout:
+                    # drop it if it hasn't started; a running search can't be interrupted,
+                    # but its result is cached when it lands
+                    if fut.cancel():
+                        status = "skipped"
+                    else:
+                        status = "timeout"
+                        if use_cache:
+                            fut.add_done_callback(partial(self._cache_late_result, p["keys"][m], format, m))
+                    format_results.append({"method": m, "duration_ms": None, "status": status, "hits": []})
+                    continue
+                self._observe_cost(m, format, r["duration_ms"])
+                for s in r.pop("spans", []):
+                    trace.add(**s, method=m)
+                # stamped where the search ran (perf_counter is system-wide), not by a
+                # done-callback, which may run only after result() has returned
+                t_done = r.pop("finished_at")
+                trace.add("queue", max(0.0, (t_done - submitted_at[(format, m)]) * 1000.0 - r["duration_ms"]), method=m)
+                if use_cache:
+                    self.cache.set(p["keys"][m], r)
+                format_results.append(r)
+            if settings.instrumentation:
+                self._record(field, format, format_results, trace.spans)
+            results.append({
+                "format": format,
+                "candidates": None if p["cands"] is None else int(len(p["cands"])),
+                "results": format_results,
+                "spans": trace.spans,
+            })
+        return results
+
+    def run_fused(
+        self,
+        query: str,
+        field: str,
+        methods: List[str] | None = None,
+        formats: list[str] | None = None,
+        limit: int | None = None,
+        method_params: Dict[str, Dict[str, Any]] | None = None,
+        candidates: str | None = None,
+        max_candidates: int | None = None,
+        recall_target: float | None = None,
+        use_cache: bool = True,
+        deadline_ms: float | None = None,
+        composite: Dict[str, Any] | None = None,
+        fusion: Dict[str, Any] | None = None,
+    ) -> Dict[str, Any]:
+        """
+        One fused ranking of every (format, method) search of `query` (see
+        app/services/fusion.py; `fusion` holds mode, weights, rrf_k and depth).
+        The searches run through run_methods, so caching, candidate generation
+        and `deadline_ms` apply to them as usual, each keeping its top `depth`
+        (settings.fusion_depth) rows with no score cutoff; like any limit, depth
+        is capped at settings.max_limit (ValueError above it). For "weighted", the
+        rows of the union a list is missing are then scored by that (format,
+        method) over just those rows (skipped for composite searches, where a
+        missing score counts as 0; still bounded by `deadline_ms`).
+        Returns {"mode", "duration_ms", "hits", "components": [{"format", "method",
+        "status", "cached", "duration_ms", "filled"}], "spans"}; `limit` caps the hits.
+        """
+        fusion = fusion or {}
+        mode = fusion.get("mode") or "rrf"
+        if mode not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {mode}")
+        _, _, limit, _, method_params = self._normalize_args(methods, formats, limit, None, method_params)
+        started = perf_counter()
+        deadline = None if deadline_ms is None else started + max(0.0, float(deadline_ms)) / 1000.0
+        depth = max(limit, int(fusion.get("depth") or settings.fusion_depth))
+        if depth > settings.max_limit:
+            raise ValueError(f"Fusion depth {depth} exceeds the maximum of {settings.max_limit} (settings.max_limit)")
+
+        data, data_version = self.data, self.data_version
+        results = self.run_methods(
+            query, field, methods, formats, depth, None, method_params, candidates, max_candidates,
+            recall_target, use_cache, deadline_ms, composite,
+        )
+        trace = Trace()
+        lists, components = [], []
+        for f in results:
+            for r in f["results"]:
+                components.append({
+                    "format": f["format"], "method": r["method"], "status": r.get("status", "ok"),
+                    "cached": r.get("cached", False), "duration_ms": r.get("duration_ms"), "filled": 0,
+                })
+                if r.get("status", "ok") == "ok":
+                    score_max = float(getattr(get_matcher(r["method"]), "score_max", 1.0))
+                    lists.append((f["format"], r["method"], list(r["hits"]), score_max))
+
+        with trace:
+            if mode == "weighted" and field != COMPOSITE and self.data_version == data_version:
+                with span("fusion_fill"):
+                    self._fill_shared_candidates(data, field, query, lists, components, method_params, deadline)
+            with span("fusion"):
+                hits = fuse(lists, mode, fusion.get("weights") or {}, float(fusion.get("rrf_k") or 60.0), limit)
+        if settings.instrumentation:
+            metrics.observe_spans(trace.spans, "fused")
+        return {
+            "mode": mode,
+            "duration_ms": (perf_counter() - started) * 1000.0,
+            "hits": hits,
+            "components": components,
+            "spans": [{**s, "format": f["format"]} for f in results for s in f.get("spans", [])] + trace.spans,
+        }
+
+    def _fill_shared_candidates(self, data, field, query, lists, components, method_params, deadline) -> None:
+        """Score each list over the union rows it lacks, appending them to its hits (see run_fused)."""
+        union = {h["index"] for _, _, hits, _ in lists for h in hits}
+        futures = []
+        done = {(c["format"], c["method"]): c for c in components}
+        for i, (format, method, hits, _) in enumerate(lists):
+            missing = np.fromiter(union.difference(h["index"] for h in hits), dtype=np.int32)
+            if not len(missing):
+                continue
+            if deadline is not None and perf_counter() >= deadline:
+                done[(format, method)]["status"] = "partial"
+                continue
+            missing.sort()
+            scorer, scorer_format, params = method, format, method_params.get(method, {})
+            if CASCADE_SEP in method:
+                # a cascade's earlier stages would drop rows (their @keep); its scores are
+                # its last stage's, so that stage scores the missing rows directly
+                last = parse_cascade(method)[-1]
+                scorer, scorer_format, params = last.method, last.format or format, params.get(last.method) or {}
+            prepared = self.prepare_query(query, scorer_format)
+            fut = self.backend.submit(
+                data, field, scorer, prepared, scorer_format, len(missing), None, params, missing, None
+            )
+            futures.append((i, fut, len(missing)))
+        for i, fut, wanted in futures:
+            format, method, hits, _ = lists[i]
+            try:
+                r = fut.result(timeout=None if deadline is None else max(0.0, deadline - perf_counter()))
+            except FutureTimeout:
+                fut.cancel()
+                done[(format, method)]["status"] = "partial"  # the rows it lacks count as 0
+                continue
+            hits.extend(r["hits"])
+            done[(format, method)]["filled"] = len(r["hits"])
+            if len(r["hits"]) < wanted:
+                done[(format, method)]["status"] = "partial"
+
+    def estimated_cost(self, method: str, format: str) -> float:
+        """
+        Expected duration_ms of (method, format): a moving average of past runs,
+        or before the first run the matcher's `cost_hint` (see app/matchers/base.py)
+        times the measured ms per hint unit of the format (of any format if it
+        has none yet). Before anything has run, the bare hints are compared.
+        """
+        cost = self._costs.get((method, format))
+        if cost is not None:
+            return cost
+        hint = float(getattr(get_matcher(method), "cost_hint", 1.0))
+        unit = self._unit_ms.get(format, self._unit_ms.get(None))
+        return hint if unit is None else hint * unit
+
+    def _observe_cost(self, method: str, format: str, duration_ms: float) -> None:
+        key = (method, format)
+        prev = self._costs.get(key)
+        self._costs[key] = duration_ms if prev is None else prev + 0.2 * (duration_ms - prev)
+        unit = duration_ms / float(getattr(get_matcher(method), "cost_hint", 1.0) or 1.0)
+        for k in (format, None):
+            prev = self._unit_ms.get(k)
+            self._unit_ms[k] = unit if prev is None else prev + 0.2 * (unit - prev)
+
+    def _cache_late_result(self, key, format: str, method: str, fut) -> None:
+        """Done-callback for a search that missed its deadline: keep its result for the next caller."""
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        r = fut.result()
+        self._observe_cost(method, format, r["duration_ms"])
+        r.pop("spans", None)
+        r.pop("finished_at", None)
+        self.cache.set(key, r)
+
+    @staticmethod
+    def _record(field: str, format: str, format_results: List[Dict[str, Any]], spans) -> None:
+        """Count one format's method runs and observe their timings in app.services.metrics."""
+        for r in format_results:
+            cached = r.get("cached", False)
+            metrics.method_runs.inc(
+                field=field, format=format, method=r["method"], status=r.get("status", "ok"),
+                cached="true" if cached else "false",
+            )
+            if not cached and r.get("duration_ms") is not None:
+                metrics.method_seconds.observe(r["duration_ms"] / 1000.0, field=field, format=format, method=r["method"])
+        metrics.observe_spans(spans, format)
+
+    def run_batch(
+        self,
+        queries: Sequence[str],
+        field: str,
+        methods: List[str] | None = None,
+        formats: list[str] | None = None,
+        limit: int | None = None,
+        score_cutoff: float | None = None,
+        method_params: Dict[str, Dict[str, Any]] | None = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Score many queries with each (format, method) in one vectorized call per
+        chunk of queries, yielding one result per query, in input order, as soon
+        as its chunk is done:
+          {"query": str, "results": [{"format": str, "results": [{"method", "duration_ms", "status", "hits"}]}]}
+        duration_ms is the chunk time for that (format, method) divided by the
+        chunk size, i.e. the amortized per-query cost.
+        Arguments are validated on the call, not on the first next(): an unknown
+        field, method or format raises ValueError before any result is produced.
+        """
+
+        methods, formats, limit, score_cutoff, method_params = self._normalize_args(
+            methods, formats, limit, score_cutoff, method_params
+        )
+        store = self._get_store(field)
+        matchers = {m: get_matcher(m) for m in methods}
+        return self._batch_items(queries, field, formats, matchers, store, limit, score_cutoff, method_params)
 
-            # collect results in the fixed order
-            format_results = [futures[m].result() for m in methods]
-            results.append({"format": format, "results": format_results})
-        return results
\ No newline at end of file
+    def _batch_items(
+        self, queries, field, formats, matchers, store, limit, score_cutoff, method_params
+    ) -> Iterator[Dict[str, Any]]:
+        methods = list(matchers)
+        step = settings.batch_chunk_size
+        for start in range(0, len(queries), step):
+            chunk = list(queries[start:start + step])
+            per_query = [[] for _ in chunk]
+            for format in formats:
+                prepared = [self.prepare_query(q, format) for q in chunk]
+                blocks = [{"format": format, "results": []} for _ in chunk]
+                for m in methods:
+                    matcher = matchers[m]
+                    params = method_params.get(m, {})
+                    t0 = perf_counter()
+                    if hasattr(matcher, "search_many"):
+                        all_hits = matcher.search_many(prepared, store, format, limit, score_cutoff, params)
+                    else:
+                        all_hits = [matcher.search(q, store, format, limit, score_cutoff, params) for q in prepared]
+                    duration_ms = (perf_counter() - t0) * 1000.0 / len(chunk)
+                    if settings.instrumentation:
+                        metrics.method_runs.inc(
+                            len(chunk), field=field, format=format, method=m, status="ok", cached="false"
+                        )
+                        metrics.stage_seconds.observe(duration_ms * len(chunk) / 1000.0, stage="batch_score", format=format)
+                    for block, hits in zip(blocks, all_hits):
+                        block["results"].append({"method": m, "duration_ms": duration_ms, "status": "ok", "hits": hits})
+                for acc, block in zip(per_query, blocks):
+                    acc.append(block)
+            for q, results in zip(chunk, per_query):
+                yield {"query": q, "results": results}
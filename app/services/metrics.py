@@ -0,0 +1,164 @@
+"""
+Search instrumentation: per-stage timing spans, counters and histograms,
+rendered in the Prometheus text exposition format at GET /metrics.
+
+Spans: code on the hot path wraps a stage in `with span("extract"):`. The
+span is recorded into the Trace active in the current context, if any, and
+costs one perf_counter pair. `run_search` (app/services/executor.py) opens
+a Trace around each (format, method) search and returns its spans with the
+result. That way spans from thread or process workers reach MatcherService,
+which observes them into `stage_seconds` in the server process. With
+settings.instrumentation off, `span` and `Trace` record nothing.
+
+Metrics are kept in-process (no prometheus_client dependency). With several
+server worker processes, each exposes its own.
+"""
+
+from __future__ import annotations
+import contextvars
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from app.core.config import settings
+
+# seconds; the Prometheus client defaults with a finer low end for sub-ms stages
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.label_names, k)} {v:g}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.label_names)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            for i, b in enumerate(self.buckets):
+                if seconds <= b:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + seconds)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        for key, (counts, total) in items:
+            cum = 0
+            for le, c in zip([f"{b:g}" for b in self.buckets] + ["+Inf"], counts):
+                cum += c
+                labels = _labels(self.label_names, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cum}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:.6g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cum}")
+        return lines
+
+
+searches = Counter("fuzzy_searches_total", "Search requests by endpoint and field.", ["endpoint", "field"])
+search_seconds = Histogram("fuzzy_search_seconds", "End-to-end search request time.", ["endpoint", "field"])
+method_runs = Counter(
+    "fuzzy_method_runs_total", "Per (format, method) searches by outcome.",
+    ["field", "format", "method", "status", "cached"],
+)
+method_seconds = Histogram(
+    "fuzzy_method_seconds", "Matcher time of one (format, method) search, as in duration_ms.",
+    ["field", "format", "method"],
+)
+stage_seconds = Histogram("fuzzy_stage_seconds", "Time per search stage (see spans).", ["stage", "format"])
+
+REGISTRY = [searches, search_seconds, method_runs, method_seconds, stage_seconds]
+
+
+def render() -> str:
+    """All metrics in the text exposition format (version 0.0.4)."""
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+
+# ---- spans ----
+
+class Trace:
+    """Spans of one unit of work: [{"name", "ms", **labels}] in completion order."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._token = None
+
+    def __enter__(self) -> "Trace":
+        if settings.instrumentation:
+            self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    def add(self, name: str, ms: float, **labels) -> None:
+        if settings.instrumentation:
+            self.spans.append({"name": name, "ms": ms, **labels})
+
+
+_current: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("fuzzy_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    """The Trace spans are being recorded into, if any."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **labels) -> Iterator[None]:
+    """Time the enclosed block into the current Trace (no-op without one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (perf_counter() - t0) * 1000.0, **labels)
+
+
+def observe_spans(spans: Sequence[Dict[str, Any]], format: str) -> None:
+    """Feed finished spans into stage_seconds."""
+    for s in spans:
+        stage_seconds.observe(s["ms"] / 1000.0, stage=s["name"], format=format)
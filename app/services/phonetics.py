@@ -0,0 +1,319 @@
+"""
+The format registry: phonetic encoders and the models behind them, loaded on
+first use.
+
+Formats register themselves like matchers do:
+
+    @register_encoder("Soundex", "name_lc_soundex", key=True)
+    def _soundex() -> Encoder: ...      # loader, returns a lowercase str -> code function
+
+and declare
+  - column: the frame / FieldStore column holding every name's encoding;
+  - batch: optional whole-column encode function (default: the encoder per value);
+  - cached: the column is persisted in the index and query encodings are
+    memoized (worth it for slow encoders); other columns are computed from
+    name_lc at load, for the formats in settings.possible_formats;
+  - key: the code of a single word is a useful exact key, so the format also
+    gets a "<column suffix>_key" candidate generator (see candidates.py);
+  - pooled: slow enough per value that large batches of queries fan out over
+    a process pool (see dataset.encode_queries).
+
+`get_encoder(format)` builds the format's encoder the first time it is asked
+for, together with any model it needs, and returns the same function from
+then on. Models are shared: `g2p()` is the one G2p instance of the process,
+used by both ARPABET and IPA. A server that only searches `raw` never
+imports g2p_en, NLTK or PanPhon.
+
+NLTK resources (the POS tagger and CMUdict that g2p_en reads) are resolved
+offline: settings.nltk_data_dir is searched first, then NLTK's default
+paths. Nothing is downloaded implicitly unless settings.nltk_download is
+set; `python -m app.build_index --download-nltk` fetches them into
+settings.nltk_data_dir ahead of time.
+
+Loading is thread-safe: concurrent first requests for a format wait for one
+load instead of each building a model.
+"""
+
+from __future__ import annotations
+import contextvars
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List
+
+from app.core.config import settings
+
+Encoder = Callable[[str], str]
+
+# NLTK resource path -> package name for nltk.download
+NLTK_RESOURCES = {
+    "taggers/averaged_perceptron_tagger_eng": "averaged_perceptron_tagger_eng",
+    "corpora/cmudict": "cmudict",
+}
+
+arpabet_to_ipa = {
+    "AA": "ɑ", "AE": "æ", "AH": "ʌ", "AO": "ɔ", "AW": "aʊ", "AY": "aɪ",
+    "B": "b", "CH": "tʃ", "D": "d", "DH": "ð", "EH": "ɛ", "ER": "ɝ", "EY": "eɪ",
+    "F": "f", "G": "ɡ", "HH": "h", "IH": "ɪ", "IY": "i", "JH": "dʒ", "K": "k",
+    "L": "l", "M": "m", "N": "n", "NG": "ŋ", "OW": "oʊ", "OY": "ɔɪ",
+    "P": "p", "R": "ɹ", "S": "s", "SH": "ʃ", "T": "t", "TH": "θ",
+    "UH": "ʊ", "UW": "u", "V": "v", "W": "w", "Y": "j", "Z": "z", "ZH": "ʒ"
+}
+
+# re-entrant: loading the IPA encoder loads the shared G2P model under the same lock
+_lock = threading.RLock()
+_models: Dict[str, Any] = {}
+_encoders: Dict[str, Encoder] = {}
+
+
+@dataclass(frozen=True)
+class Format:
+    """A registered format (see register_encoder)."""
+    name: str
+    column: str
+    loader: Callable[[], Encoder]
+    batch: Callable[[List[str]], List[str]] | None = None
+    cached: bool = False
+    key: bool = False
+    pooled: bool = False
+
+    def encode_batch(self, values: List[str]) -> List[str]:
+        """Encodings of lowercase `values`, in order."""
+        if self.batch is not None:
+            return self.batch(values)
+        encode = get_encoder(self.name)
+        return [encode(v) for v in values]
+
+
+_FORMATS: Dict[str, Format] = {}
+
+
+def shared(name: str, factory: Callable[[], Any]) -> Any:
+    """The process-wide instance of model `name`, created by `factory` on first use."""
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = factory()
+    return model
+
+
+def register_encoder(
+    format: str,
+    column: str,
+    batch: Callable[[List[str]], List[str]] | None = None,
+    cached: bool = False,
+    key: bool = False,
+    pooled: bool = False,
+):
+    """Register a loader returning the encoder for `format`; it runs on the first get_encoder(format)."""
+    def _wrap(loader: Callable[[], Encoder]) -> Callable[[], Encoder]:
+        _FORMATS[format] = Format(format, column, loader, batch, cached, key, pooled)
+        return loader
+    return _wrap
+
+
+def get_format(format: str) -> Format:
+    spec = _FORMATS.get(format)
+    if spec is None:
+        raise ValueError(f"Unknown format: {format}")
+    return spec
+
+
+def list_formats() -> List[Format]:
+    """Every registered format, in registration order."""
+    return list(_FORMATS.values())
+
+
+def get_encoder(format: str) -> Encoder:
+    encoder = _encoders.get(format)
+    if encoder is None:
+        loader = get_format(format).loader
+        with _lock:
+            encoder = _encoders.get(format)
+            if encoder is None:
+                encoder = _encoders[format] = loader()
+    return encoder
+
+
+# ---- NLTK / G2P ----
+
+def _nltk_path() -> None:
+    import nltk
+    path = str(settings.nltk_data_dir)
+    if path not in nltk.data.path:
+        nltk.data.path.insert(0, path)
+
+
+def missing_nltk_resources() -> list[str]:
+    import nltk
+    _nltk_path()
+    missing = []
+    for resource, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(package)
+    return missing
+
+
+def download_nltk_data(quiet: bool = False) -> list[str]:
+    """Fetch the missing NLTK resources into settings.nltk_data_dir; returns what was fetched."""
+    import nltk
+    missing = missing_nltk_resources()
+    if missing:
+        settings.nltk_data_dir.mkdir(parents=True, exist_ok=True)
+    for package in missing:
+        if not nltk.download(package, download_dir=str(settings.nltk_data_dir), quiet=quiet):
+            raise RuntimeError(f"Could not download NLTK resource {package!r}")
+    return missing
+
+
+@contextmanager
+def _no_implicit_downloads() -> Iterator[None]:
+    # g2p_en probes for resources at import and calls nltk.download for any it
+    # misses, including the pre-3.9 tagger that current NLTK no longer reads
+    import nltk
+    download = nltk.download
+    nltk.download = lambda *args, **kwargs: False
+    try:
+        yield
+    finally:
+        nltk.download = download
+
+
+def _load_g2p():
+    missing = missing_nltk_resources()
+    if missing and settings.nltk_download:
+        download_nltk_data(quiet=True)
+    elif missing:
+        raise RuntimeError(
+            f"NLTK resources {missing} not found in {settings.nltk_data_dir} or NLTK's default paths; "
+            "run `python -m app.build_index --download-nltk` or set FUZZYAPP_NLTK_DOWNLOAD=true"
+        )
+    with _no_implicit_downloads():
+        from g2p_en import G2p
+    return G2p()
+
+
+def g2p():
+    """The process's G2p instance (each process-pool worker loads its own)."""
+    return shared("g2p", _load_g2p)
+
+
+def arpabet_seq_to_ipa(arpas) -> str:
+    ipa = []
+    for sym in arpas:
+        if sym == " ":
+            continue
+        # strip stress digits (e.g., IH1 -> IH)
+        base = ''.join([c for c in sym if not c.isdigit()])
+        ipa.append(arpabet_to_ipa.get(base, base.lower()))
+    return ''.join(ipa)
+
+
+# token -> (ARPABET, IPA) within a shared_transcriptions() block
+_token_phones: contextvars.ContextVar[dict | None] = contextvars.ContextVar("token_phones", default=None)
+
+
+@contextmanager
+def shared_transcriptions() -> Iterator[None]:
+    """Within the block the G2P formats share token transcriptions, so ARPABET and IPA cost one G2P pass."""
+    token = _token_phones.set({})
+    try:
+        yield
+    finally:
+        _token_phones.reset(token)
+
+
+def _g2p_batch(part: int, sep: str) -> Callable[[List[str]], List[str]]:
+    """
+    Column encoder for a G2P format: each distinct word is transcribed once
+    (over a process pool, see dataset.transcribe_tokens) and a name's words
+    joined with `sep`, as g2p joins them.
+    """
+    def batch(values: List[str]) -> List[str]:
+        from app.services.dataset import transcribe_tokens
+        split = [v.split() for v in values]
+        tokens = list(dict.fromkeys(t for parts in split for t in parts))
+        memo = _token_phones.get()
+        if memo is None:
+            phones = transcribe_tokens(tokens)
+        else:
+            todo = [t for t in tokens if t not in memo]
+            if todo:
+                memo.update(transcribe_tokens(todo))
+            phones = memo
+        return [sep.join(phones[t][part] for t in parts) for parts in split]
+    return batch
+
+
+# runs of letters: anything else (spaces, hyphens, apostrophes, digits) separates words
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def split_words(s: str) -> List[str]:
+    """The words of `s` for per-word codes: "jean-luc" -> ["jean", "luc"], like "jean luc"."""
+    return _WORD.findall(s)
+
+
+def _per_word(code: Callable[[str], str]) -> Encoder:
+    """`code` applied to each word (see split_words), joined with spaces."""
+    def encode(s: str) -> str:
+        return " ".join(code(w) for w in split_words(s))
+    return encode
+
+
+# ---- encoders ----
+
+@register_encoder("raw", "name_lc")
+def _raw() -> Encoder:
+    return str
+
+
+@register_encoder("Metaphone", "name_lc_metaphone", cached=True, key=True)
+def _metaphone() -> Encoder:
+    import jellyfish
+    return jellyfish.metaphone
+
+
+@register_encoder("ARPABET", "name_lc_arpabet", batch=_g2p_batch(0, " "), cached=True, pooled=True)
+def _arpabet() -> Encoder:
+    model = g2p()
+    return lambda s: "".join(model(s))
+
+
+@register_encoder("IPA", "name_lc_ipa", batch=_g2p_batch(1, ""), cached=True, pooled=True)
+def _ipa() -> Encoder:
+    model = g2p()
+    return lambda s: arpabet_seq_to_ipa(model(s))
+
+
+@register_encoder("Soundex", "name_lc_soundex", key=True)
+def _soundex() -> Encoder:
+    import jellyfish
+    return _per_word(jellyfish.soundex)
+
+
+@register_encoder("NYSIIS", "name_lc_nysiis", key=True)
+def _nysiis() -> Encoder:
+    import jellyfish
+    return _per_word(jellyfish.nysiis)
+
+
+@register_encoder("MatchRating", "name_lc_match_rating", key=True)
+def _match_rating() -> Encoder:
+    import jellyfish
+    return _per_word(jellyfish.match_rating_codex)
+
+
+@register_encoder("DoubleMetaphone", "name_lc_double_metaphone", key=True)
+def _double_metaphone() -> Encoder:
+    # primary codes only; needs the optional `metaphone` package
+    try:
+        from metaphone import doublemetaphone
+    except ImportError:
+        raise RuntimeError("the DoubleMetaphone format needs the `metaphone` package (pip install metaphone)") from None
+    return _per_word(lambda w: doublemetaphone(w)[0])
@@ -0,0 +1,179 @@
+"""
+Precomputed PanPhon segment tables for the panphon_sim matchers.
+
+PanPhon's pairwise distances re-segment both strings on every call and run
+their edit-distance DP in Python, one pair at a time. A SegmentTable segments
+a column once: each row becomes a sequence of ids into the column's vocabulary
+of distinct segments, whose numeric feature vectors and Dolgopolsky-prime
+classes are looked up once per segment instead of once per occurrence.
+
+Scoring against a table then takes
+  - fast Levenshtein / Dolgopolsky': RapidFuzz Levenshtein over the column (or
+    its precomputed D' class strings), normalized by the stored segment counts;
+  - feature edit distance: `SegmentTable.feature_edit_distance`, a NumPy DP
+    that advances one segment at a time over a whole batch of rows, with the
+    query's substitution costs against the vocabulary computed once per query.
+
+Tables for settings.panphon_formats (those also in settings.possible_formats)
+are built at load (build_segment_tables); any other format gets one on first
+use. Either way it is kept on the FieldStore it was built from. PanPhon
+itself is imported with the first table or query.
+"""
+
+from __future__ import annotations
+from typing import Iterable, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.dataset import DataContainer, FieldStore
+from app.services.phonetics import shared
+
+
+def _load_panphon():
+    import panphon.distance as ppd
+    return ppd.Distance()
+
+
+def panphon_distance():
+    """The process's panphon Distance (its feature tables load on first use)."""
+    return shared("panphon", _load_panphon)
+
+
+def _weights() -> np.ndarray:
+    return shared("panphon_weights", lambda: np.asarray(panphon_distance().fm.weights, dtype=np.float64))
+
+
+def query_segments(s: str) -> Tuple[list, np.ndarray]:
+    """PanPhon segments of `s` and their (n_segments, n_features) numeric feature vectors."""
+    fm = panphon_distance().fm
+    segs = fm.ipa_segs(s)
+    feats = np.asarray([fm.fts(seg, False).numeric() for seg in segs], dtype=np.float64)
+    return segs, feats.reshape(len(segs), len(fm.names))
+
+
+def _indel_costs(feats: np.ndarray, weighted: bool) -> np.ndarray:
+    """Insertion/deletion cost per segment, as in panphon.distance.Distance."""
+    if weighted:
+        return np.full(len(feats), _weights().sum())
+    return np.where(feats == 0, 0.5, 1.0).mean(axis=1)
+
+
+def _substitution_costs(q: np.ndarray, vocab: np.ndarray, weighted: bool) -> np.ndarray:
+    """(len(q), len(vocab)) substitution costs, as in panphon.distance.Distance."""
+    diff = np.abs(q[:, None, :] - vocab[None, :, :])
+    if weighted:
+        # PanPhon zips the vectors with the weights, so only the weighted features count
+        weights = _weights()
+        return diff[:, :, :len(weights)] @ weights
+    return diff.mean(axis=2) / 2
+
+
+class SegmentTable:
+    """PanPhon segmentation of one column of a FieldStore."""
+
+    def __init__(self, values: Sequence[str]):
+        dst = panphon_distance()
+        fm = dst.fm
+        vocab: dict[str, int] = {}
+        dolgo_of: dict[str, str] = {}
+        rows, dolgo = [], []
+        for v in values:
+            nv = fm.normalize(v)
+            segs = fm.ipa_segs(nv, normalize=False)
+            rows.append([vocab.setdefault(seg, len(vocab)) for seg in segs])
+            # Distance.map_to_dolgo_prime, memoized per segment; it segments the
+            # unnormalized string by longest match, which the trie does far faster
+            # than its regex
+            labels = []
+            for seg in (segs if nv == v else fm.ipa_segs(v, normalize=False)):
+                if seg not in dolgo_of:
+                    dolgo_of[seg] = dst.map_to_dolgo_prime(seg)
+                labels.append(dolgo_of[seg])
+            dolgo.append("".join(labels))
+
+        n = len(rows)
+        self.lengths = np.fromiter(map(len, rows), dtype=np.int32, count=n)
+        self.char_lengths = np.fromiter(map(len, values), dtype=np.int32, count=n)
+        self.dolgo: tuple = tuple(dolgo)
+
+        # row -> segment ids, padded with the sentinel id len(vocab)
+        pad = len(vocab)
+        width = int(self.lengths.max()) if n else 0
+        self.segs = np.full((n, width), pad, dtype=np.int16 if pad < np.iinfo(np.int16).max else np.int32)
+        for i, r in enumerate(rows):
+            self.segs[i, :len(r)] = r
+
+        n_feats = len(fm.names)
+        self.features = np.zeros((pad + 1, n_feats), dtype=np.float64)
+        for seg, i in vocab.items():
+            self.features[i] = fm.fts(seg, False).numeric()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def min_indel_cost(self, q_feats: np.ndarray, weighted: bool) -> float:
+        """Cheapest single insertion or deletion against this table, for length-based lower bounds."""
+        costs = np.concatenate([_indel_costs(q_feats, weighted), _indel_costs(self.features[:-1], weighted)])
+        return float(costs.min()) if len(costs) else 0.0
+
+    def feature_edit_distance(self, q_feats: np.ndarray, rows: np.ndarray, weighted: bool = True) -> np.ndarray:
+        """
+        PanPhon (weighted) feature edit distance from the query segments to each
+        of `rows`, for all of them at once. Rows are processed in length-sorted
+        batches of settings.panphon_batch_rows to keep padding small.
+        """
+        m = len(q_feats)
+        sub = _substitution_costs(q_feats, self.features, weighted)   # (m, vocab + pad)
+        ins = _indel_costs(self.features, weighted)                    # per target segment
+        cum_del = np.concatenate([[0.0], np.cumsum(_indel_costs(q_feats, weighted))])[:, None]
+
+        out = np.empty(len(rows), dtype=np.float64)
+        order = np.argsort(self.lengths[rows], kind="stable")
+        step = max(1, settings.panphon_batch_rows)
+        for start in range(0, len(order), step):
+            pos = order[start:start + step]
+            batch = rows[pos]
+            lens = self.lengths[batch]
+            width = int(lens.max()) if len(lens) else 0
+            segs = self.segs[batch, :width]
+
+            # d[j] = distance from the first j query segments to the row prefix read so far
+            d = np.repeat(cum_del, len(batch), axis=1)
+            res = np.full(len(batch), cum_del[m, 0])
+            for i in range(width):
+                s = segs[:, i]
+                step_ins = ins[s]
+                a = np.empty_like(d)
+                a[0] = d[0] + step_ins
+                a[1:] = np.minimum(d[1:] + step_ins, d[:-1] + sub[:, s])
+                # deletions chain along the query: d[j] = min over k <= j of a[k] + (cum_del[j] - cum_del[k])
+                d = np.minimum.accumulate(a - cum_del, axis=0) + cum_del
+                ended = lens == i + 1
+                res[ended] = d[m, ended]
+            out[pos] = res
+        # drop the float noise of the prefix-sum trick so equal distances compare equal
+        return np.round(out, 12)
+
+
+def segment_table(store: FieldStore, format: str) -> SegmentTable:
+    """The store's SegmentTable for `format`, built on first use."""
+    key = ("segments", format)
+    table = store.derived.get(key)
+    if table is None:
+        table = store.derived[key] = SegmentTable(store.choices(format))
+    return table
+
+
+def build_segment_tables(container: DataContainer, formats: Iterable[str] | None = None) -> None:
+    """
+    Build the SegmentTable of every field for `formats` (default: the
+    settings.panphon_formats that are in settings.possible_formats).
+    """
+    if formats is None:
+        formats = [f for f in settings.panphon_formats if f in settings.possible_formats]
+    formats = list(formats)
+    for field in ("first", "last", "full"):
+        store = container.store(field)
+        for format in formats:
+            segment_table(store, format)
@@ -0,0 +1,32 @@
+"""
+Shared fixtures: a small synthetic dataset searched in its raw format only,
+so no phonetic model (G2P, NLTK) is needed.
+"""
+
+import random
+
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.services.dataset import DataContainer
+
+FIRST = ["jon", "john", "jean", "joan", "ana", "anna", "hannah", "mark", "marc", "marco", "lee", "li", "kim"]
+LAST = ["smith", "smyth", "schmidt", "jones", "johns", "lee", "leigh", "park", "parks", "marquez", "kim"]
+
+
+def _frame(names):
+    return pd.DataFrame({"name": names, "name_lc": [n.lower() for n in names]})
+
+
+@pytest.fixture
+def data(monkeypatch):
+    """A DataContainer of 600 full names drawn with repeats, so many rows tie on score."""
+    monkeypatch.setattr(settings, "possible_formats", ["raw"])
+    rng = random.Random(7)
+    full = [f"{rng.choice(FIRST).title()} {rng.choice(LAST).title()}" for _ in range(600)]
+    return DataContainer(
+        df_first=_frame([n.split()[0] for n in full]),
+        df_last=_frame([n.split()[1] for n in full]),
+        df_full=_frame(full),
+    )
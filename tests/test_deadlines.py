@@ -0,0 +1,18 @@
+"""deadline_ms on MatcherService.run_methods (see its docstring)."""
+
+from app.core.config import settings
+from app.services.matcher_service import MatcherService
+
+METHODS = ["rapidfuzz_ratio", "rapidfuzz_Wratio", "rapidfuzz_Indel"]
+
+
+def test_inline_backend_skips_searches_past_the_deadline(data, monkeypatch):
+    monkeypatch.setattr(settings, "executor_backend", "inline")
+    service = MatcherService(data)
+    try:
+        results = service.run_methods("jon smith", "full", METHODS, ["raw"], 10, 0.0, use_cache=False, deadline_ms=0)
+        assert [r["status"] for r in results[0]["results"]] == ["skipped"] * len(METHODS)
+        results = service.run_methods("jon smith", "full", METHODS, ["raw"], 10, 0.0, use_cache=False)
+        assert [r["status"] for r in results[0]["results"]] == ["ok"] * len(METHODS)
+    finally:
+        service.close()
@@ -0,0 +1,115 @@
+"""Fused rankings against a brute-force recomputation from full scans (see app/services/fusion.py)."""
+
+import pytest
+
+from app.core.config import settings
+from app.matchers.base import get_matcher
+from app.services.fusion import fuse
+from app.services.matcher_service import MatcherService
+
+# scores on both scales: fuzz.* (0-100) and normalized similarities (0-1)
+METHODS = ["rapidfuzz_ratio", "rapidfuzz_Indel", "rapidfuzz_JaroWinkler"]
+WEIGHTS = {"raw/rapidfuzz_ratio": 2.0, "rapidfuzz_JaroWinkler": 0.5}
+QUERIES = ["jon smyth", "hannah leigh", "marco"]
+
+
+def _weight(method):
+    return {"rapidfuzz_ratio": 2.0, "rapidfuzz_JaroWinkler": 0.5}.get(method, 1.0)
+
+
+def _brute_force(store, query, mode, depth, rrf_k, limit):
+    """Top `limit` (row, fused score), every list scored over the whole field."""
+    scans = {m: get_matcher(m).search(query, store, "raw", len(store), None) for m in METHODS}
+    union = {h["index"] for hits in scans.values() for h in hits[:depth]}
+    fused = {}
+    for m, hits in scans.items():
+        for rank, h in enumerate(hits, start=1):
+            if mode == "rrf" and rank <= depth:
+                contribution = _weight(m) / (rrf_k + rank)
+            elif mode == "weighted" and h["index"] in union:
+                contribution = _weight(m) * h["score"] / get_matcher(m).score_max
+            else:
+                continue
+            fused[h["index"]] = fused.get(h["index"], 0.0) + contribution
+    top = sorted(fused, key=lambda row: (-fused[row], row))[:limit]
+    return [(row, fused[row]) for row in top]
+
+
+@pytest.mark.parametrize("mode", ["rrf", "weighted"])
+@pytest.mark.parametrize("depth", [5, 20])
+def test_run_fused_matches_brute_force(data, monkeypatch, mode, depth):
+    monkeypatch.setattr(settings, "executor_backend", "inline")
+    service = MatcherService(data)
+    try:
+        for query in QUERIES:
+            got = service.run_fused(
+                query, "full", METHODS, ["raw"], 5, candidates="full", use_cache=False,
+                fusion={"mode": mode, "depth": depth, "weights": WEIGHTS, "rrf_k": 60},
+            )
+            expected = _brute_force(data.store("full"), query, mode, depth, 60.0, 5)
+            assert [h["index"] for h in got["hits"]] == [row for row, _ in expected]
+            assert [h["score"] for h in got["hits"]] == pytest.approx([score for _, score in expected])
+            assert all(c["status"] == "ok" for c in got["components"])
+    finally:
+        service.close()
+
+
+def test_fuse_rrf_and_ties():
+    a = [{"index": 3, "match": "c", "score": 90.0}, {"index": 1, "match": "a", "score": 80.0}]
+    b = [{"index": 1, "match": "a", "score": 0.9}, {"index": 3, "match": "c", "score": 0.5}]
+    hits = fuse([("raw", "x", a, 100.0), ("raw", "y", b, 1.0)], "rrf", {}, 60.0, 10)
+    # rows 1 and 3 each rank 1 once and 2 once: equal scores, so row order decides
+    assert [h["index"] for h in hits] == [1, 3]
+    assert hits[0]["score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert hits[0]["extras"]["scores"] == {"raw/x": 80.0, "raw/y": 0.9}
+
+
+def test_fuse_weighted_normalizes_and_weighs():
+    a = [{"index": 0, "match": "a", "score": 50.0}]
+    b = [{"index": 0, "match": "a", "score": 0.25}]
+    weights = {"raw/x": 3.0, "raw": 2.0, "y": 0.5}
+    hits = fuse([("raw", "x", a, 100.0), ("raw", "y", b, 1.0)], "weighted", weights, 60.0, 10)
+    assert hits[0]["score"] == pytest.approx(3.0 * 0.5 + 2.0 * 0.5 * 0.25)
+
+
+def test_fuse_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        fuse([], "max", {}, 60.0, 10)
+
+
+def test_run_fused_rejects_depth_above_max_limit(data):
+    service = MatcherService(data)
+    try:
+        with pytest.raises(ValueError):
+            service.run_fused("jon", "full", METHODS, ["raw"], 5, fusion={"depth": settings.max_limit + 1})
+    finally:
+        service.close()
+
+
+def test_weighted_fill_scores_every_candidate_of_a_cascade(data, monkeypatch):
+    monkeypatch.setattr(settings, "executor_backend", "inline")
+    store = data.store("full")
+    cascade = "rapidfuzz_Indel@50>rapidfuzz_Wratio@5"
+    service = MatcherService(data)
+    try:
+        got = service.run_fused(
+            "jon smyth", "full", ["rapidfuzz_ratio", cascade], ["raw"], 10, candidates="full", use_cache=False,
+            fusion={"mode": "weighted", "depth": 30},
+        )
+    finally:
+        service.close()
+    ratio = get_matcher("rapidfuzz_ratio").search("jon smyth", store, "raw", len(store), None)
+    kept = get_matcher(cascade).search("jon smyth", store, "raw", 30, None)
+    union = {h["index"] for h in ratio[:30]} | {h["index"] for h in kept}
+    # the cascade's scores are its last stage's, over every shared candidate
+    wratio = {h["index"]: h["score"] for h in get_matcher("rapidfuzz_Wratio").search("jon smyth", store, "raw", len(store), None)}
+    fused = {row: wratio[row] / 100.0 for row in union}
+    for h in ratio:
+        if h["index"] in union:
+            fused[h["index"]] += h["score"] / 100.0
+    expected = sorted(fused, key=lambda row: (-fused[row], row))[:10]
+    components = {c["method"]: c for c in got["components"]}
+    assert components[cascade]["status"] == "ok"
+    assert components[cascade]["filled"] == len(union) - len(kept)
+    assert [h["index"] for h in got["hits"]] == expected
+    assert [h["score"] for h in got["hits"]] == pytest.approx([fused[row] for row in expected])
@@ -0,0 +1,109 @@
+"""Sharded searches return exactly the hits of one unsharded scan (see app/services/executor.py)."""
+
+from concurrent.futures import CancelledError, Future
+from functools import partial
+
+import pytest
+
+from app.core.config import settings
+from app.matchers.base import get_matcher
+from app.services.executor import GatheredFuture, gather, merge_shard_results, run_search
+from app.services.matcher_service import MatcherService
+
+METHODS = [
+    "rapidfuzz_ratio", "rapidfuzz_Wratio", "rapidfuzz_token_set_ratio",
+    "rapidfuzz_Indel", "rapidfuzz_JaroWinkler", "rapidfuzz_Levenshtein",
+]
+QUERIES = ["jon smith", "ana lee", "marc parks", "kim"]
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("cutoff", [None, 0.6])
+@pytest.mark.parametrize("count", [2, 3, 7])
+def test_merge_matches_full_scan(data, method, cutoff, count):
+    store = data.store("full")
+    # in the scorer's own scale
+    score_cutoff = None if cutoff is None else cutoff * get_matcher(method).score_max
+    for query in QUERIES:
+        prepared = MatcherService.prepare_query(query, "raw")
+        args = (data, "full", method, prepared, "raw", 25, score_cutoff, {})
+        whole = run_search(*args)
+        parts = [run_search(*args, rows) for rows in store.shards(count)]
+        merged = merge_shard_results(parts, 25)
+        assert merged["hits"] == whole["hits"]
+        assert merged["duration_ms"] == max(p["duration_ms"] for p in parts)
+
+
+@pytest.mark.parametrize("backend", ["inline", "thread"])
+def test_sharded_service_matches_unsharded(data, monkeypatch, backend):
+    monkeypatch.setattr(settings, "executor_backend", backend)
+    methods = METHODS + ["rapidfuzz_Indel@50>rapidfuzz_Wratio"]
+
+    def search(shards):
+        monkeypatch.setattr(settings, "shards", shards)
+        monkeypatch.setattr(settings, "shard_min_rows", 50)
+        service = MatcherService(data)
+        try:
+            return [
+                [(r["method"], r["status"], r["hits"]) for r in f["results"]]
+                for query in QUERIES
+                for f in service.run_methods(query, "full", methods, ["raw"], 30, 0.0, use_cache=False)
+            ]
+        finally:
+            service.close()
+
+    assert search(4) == search(1)
+
+
+def _done(value) -> Future:
+    f = Future()
+    f.set_result(value)
+    return f
+
+
+def test_gather_merges_parts_once_all_are_done():
+    parts = [Future(), Future()]
+    gathered = gather(parts, sum)
+    assert isinstance(gathered, GatheredFuture)
+    parts[1].set_result(2)
+    assert not gathered.done()
+    parts[0].set_result(1)
+    assert gathered.result(timeout=0) == 3
+
+
+def test_gather_of_one_part_is_that_part():
+    part = _done(1)
+    assert gather([part], sum) is part
+
+
+def test_gather_raises_a_parts_exception():
+    failed = Future()
+    failed.set_exception(KeyError("boom"))
+    gathered = gather([_done(1), failed], sum)
+    with pytest.raises(KeyError):
+        gathered.result(timeout=0)
+
+
+def test_gathered_future_cancels_only_as_a_whole():
+    parts = [Future(), Future()]
+    gathered = gather(parts, partial(merge_shard_results, limit=5))
+    assert gathered.cancel()
+    assert gathered.cancelled()
+    assert all(p.cancelled() for p in parts)
+
+    parts = [Future(), Future()]
+    gathered = gather(parts, sum)
+    assert parts[0].set_running_or_notify_cancel()
+    assert not gathered.cancel()  # a part is running: the rest run too
+    assert not any(p.cancelled() for p in parts)
+    parts[0].set_result(1)
+    parts[1].set_result(2)
+    assert gathered.result(timeout=0) == 3
+
+
+def test_gathered_future_fails_if_a_part_was_cancelled_alone():
+    parts = [_done(1), Future()]
+    gathered = gather(parts, sum)
+    parts[1].cancel()
+    with pytest.raises(CancelledError):
+        gathered.result(timeout=0)
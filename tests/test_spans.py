@@ -0,0 +1,24 @@
+"""Per-method spans of MatcherService.run_methods (see app/services/metrics.py)."""
+
+import pytest
+
+from app.core.config import settings
+from app.services.matcher_service import MatcherService
+
+METHODS = ["rapidfuzz_ratio", "rapidfuzz_Indel", "rapidfuzz_JaroWinkler", "rapidfuzz_Wratio"]
+
+
+@pytest.mark.parametrize("shards", [1, 4])
+def test_every_search_has_a_queue_span(data, monkeypatch, shards):
+    monkeypatch.setattr(settings, "executor_backend", "thread")
+    monkeypatch.setattr(settings, "shards", shards)
+    monkeypatch.setattr(settings, "shard_min_rows", 50)
+    service = MatcherService(data)
+    try:
+        for _ in range(50):
+            results = service.run_methods("jon smith", "full", METHODS, ["raw"], 10, 0.0, use_cache=False)
+            queued = [s["method"] for s in results[0]["spans"] if s["name"] == "queue"]
+            assert sorted(queued) == sorted(METHODS)
+            assert all("finished_at" not in r for r in results[0]["results"])
+    finally:
+        service.close()